@@ -1,13 +1,31 @@
-from flask import Flask, render_template, redirect, request, session, url_for, jsonify, Response
+from flask import Flask, render_template, redirect, request, session, url_for, jsonify, Response, stream_with_context
 from datetime import datetime
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import os
 from flask_sqlalchemy import SQLAlchemy
-from threading import Lock
+from sqlalchemy import text, func, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from threading import Lock, Thread
+from concurrent.futures import ThreadPoolExecutor
 import time
 import json
 import base64
+import uuid
+import zlib
+import sys
+import bisect
+import heapq
+import re
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy as np  # Vectorizes attribute and audio feature range filters over big libraries
+except ImportError:
+    np = None
 
 
 try:
@@ -37,14 +55,976 @@ except Exception as e:
     print(f"ERROR - Failed during app initialization: {e}")
     raise
 
-# Global cache storage (better than session for large data)
-liked_songs_cache = {}
-cache_lock = Lock()
+class BoundedCache:
+    """Thread-safe LRU cache with TTL expiry and a cap on entries and (estimated) bytes.
+    
+    Keeps hit/miss/eviction counters so we can see how well it's doing.
+    """
+    
+    def __init__(self, max_entries=50, max_bytes=None, ttl=None, sizeof=None, name='liked songs cache'):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or sys.getsizeof
+        self.lock = Lock()
+        self._entries = OrderedDict()  # key -> (value, stored_at, size), least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, stored_at, size = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time(), size)
+            self.total_bytes += size
+            
+            # Evict least recently used entries until we're back within limits (always keep the newest)
+            while len(self._entries) > 1 and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+                print(f"DEBUG - Evicted {self.name} entry {oldest_key}")
+    
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+    
+    def _remove(self, key):
+        value, stored_at, size = self._entries.pop(key)
+        self.total_bytes -= size
+        return value
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def values(self):
+        """Snapshot of every live value, without touching LRU order or the counters"""
+        with self.lock:
+            return [value for value, stored_at, size in self._entries.values()]
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self.total_bytes = 0
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+# Relative weight of a match in each indexed field: title > artist > album
+SEARCH_FIELD_WEIGHTS = (3.0, 2.0, 1.0)
+SEARCH_PREFIX_FACTOR = 0.6  # A prefix match counts for less than a whole-word match
+
+
+def fold_text(text):
+    """Lowercase and strip accents so 'Beyoncé' and 'beyonce' compare equal"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def search_tokens(text):
+    """Folded word tokens of text"""
+    return re.findall(r'\w+', fold_text(text))
+
+
+# Criteria keys (smart playlist [ST:] format) for the manual 1-5 attributes -> LikedSongsStore column (0 when unset)
+FILTER_RANGE_COLUMNS = {'t': 'tempos', 'e': 'energies', 'm': 'moods'}
+# The 1-5 attributes are always constrained, so songs without them never match
+FILTER_DEFAULT_RANGES = {'t': [1, 5], 'e': [1, 5], 'm': [1, 5]}
+
+# Criteria keys for exact Spotify audio feature ranges, only applied when present.
+# Each maps to (LikedSongsStore column, Song column, request parameter prefix); either bound may be None.
+AUDIO_FEATURE_FILTERS = {
+    'bpm': ('spotify_tempos', 'spotify_tempo', 'bpm'),
+    'se': ('spotify_energies', 'spotify_energy', 'audio_energy'),
+    'sv': ('spotify_valences', 'spotify_valence', 'valence')
+}
+# LikedSongsStore columns filtered through NumPy masks (audio features go through their sorted orders instead)
+NUMPY_FILTER_COLUMNS = list(FILTER_RANGE_COLUMNS.values())
+
+
+def feature_range_bounds(value_range):
+    """(low, high) of an audio feature range, with missing bounds open-ended"""
+    low, high = value_range
+    return (float('-inf') if low is None else float(low), float('inf') if high is None else float(high))
+
+
+def audio_feature_criteria(params):
+    """Audio feature ranges in criteria form from parameters like bpm_min=118, bpm_max=124 or audio_energy_min=0.8"""
+    criteria = {}
+    for key, (store_column, song_column, param) in AUDIO_FEATURE_FILTERS.items():
+        low, high = params.get(f'{param}_min'), params.get(f'{param}_max')
+        low = None if low in (None, '') else float(low)
+        high = None if high in (None, '') else float(high)
+        if low is not None or high is not None:
+            criteria[key] = [low, high]
+    return criteria
+
+
+def drop_open_feature_ranges(criteria):
+    """Remove audio feature ranges with neither bound set (e.g. [null, null]) so every filter treats them as absent"""
+    for key in AUDIO_FEATURE_FILTERS:
+        value_range = criteria.get(key)
+        if key in criteria and (not value_range or all(bound is None for bound in value_range)):
+            del criteria[key]
+    return criteria
+
+
+# Recent filter results of every user's LikedSongsStore, so sliding back and forth doesn't re-evaluate the library.
+# One cache for the whole worker keeps the total bounded however many users are cached.
+filter_result_cache = BoundedCache(
+    max_entries=int(os.environ.get('FILTER_CACHE_MAX_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('FILTER_CACHE_MAX_MB', 16)) * 1024 * 1024,
+    name='filter result cache'
+)
+
+
+def normalize_filter_criteria(criteria):
+    """Hashable form of filter criteria in which equivalent criteria compare equal"""
+    ranges = []
+    for key in FILTER_RANGE_COLUMNS:
+        value_range = criteria.get(key, FILTER_DEFAULT_RANGES[key])
+        ranges.append((float(value_range[0]), float(value_range[1])))
+    for key in AUDIO_FEATURE_FILTERS:
+        ranges.append(feature_range_bounds(criteria[key]) if criteria.get(key) else None)
+    return (tuple(ranges),
+            tuple(sorted({int(tag_id) for tag_id in criteria.get('i', [])})),
+            tuple(sorted({int(tag_id) for tag_id in criteria.get('x', [])})))
+
+
+def ranked_order_size(ranked):
+    """Bytes held by a ranked_search_cache entry (index and score arrays)"""
+    return sum(sys.getsizeof(part) for part in ranked)
+
+
+# Full ranked orders of recent searches, only worked out once someone asks for a page past the first
+ranked_search_cache = BoundedCache(
+    max_entries=int(os.environ.get('RANKED_SEARCH_CACHE_MAX_ENTRIES', 16)),
+    max_bytes=int(os.environ.get('RANKED_SEARCH_CACHE_MAX_MB', 4)) * 1024 * 1024,
+    sizeof=ranked_order_size,
+    name='ranked search cache'
+)
+
+
+def nan_if_none(value):
+    return float('nan') if value is None else value
+
+
+def bitmap_indexes(bitmap):
+    """Positions of the set bits in bitmap, lowest first"""
+    # Scanning the binary string is far quicker than peeling bits off a big int one at a time
+    bits = bin(bitmap)[:1:-1]
+    indexes = []
+    index = bits.find('1')
+    while index != -1:
+        indexes.append(index)
+        index = bits.find('1', index + 1)
+    return indexes
+
+
+class LikedSongsStore:
+    """Column-oriented storage for one user's cached liked songs.
+    
+    Song i lives at index i of each parallel column. Artist and album strings
+    are interned, tags are tuples of tag ids (resolved through tag_table), and
+    the folded search text lives in a single newline-joined blob with a
+    trigram index over it. A word index over title/artist/album backs ranked
+    search, and a bitmap per tag (bit i set when song i carries it) backs tag
+    filters, and a sorted array of untagged positions backs untagged
+    navigation. All indexes are updated as songs are appended.
+    """
+    
+    __slots__ = ('spotify_ids', 'db_ids', 'positions', 'names', 'artists', 'albums', 'tag_ids',
+                 'tempos', 'energies', 'moods', 'index_by_db_id', 'search_blob', 'search_starts',
+                 'trigrams', '_pending_texts', '_blob_length', 'token_postings', '_sorted_tokens',
+                 'tag_bitmaps', 'spotify_tempos', 'spotify_energies', 'spotify_valences', 'version',
+                 '_feature_orders', '_numpy_columns', '_untagged_positions', 'change_id', 'cache_id')
+    
+    def __init__(self):
+        self.spotify_ids = []
+        self.db_ids = array('l')
+        self.positions = array('l')  # Offset in Spotify's Liked Songs (null tracks leave gaps)
+        self.names = []
+        self.artists = []
+        self.albums = []
+        self.tag_ids = []
+        # Manual 1-5 attributes, 0 meaning not set yet
+        self.tempos = array('b')
+        self.energies = array('b')
+        self.moods = array('b')
+        # Spotify audio features (BPM, 0-1 energy, 0-1 valence), NaN until fetched
+        self.spotify_tempos = array('d')
+        self.spotify_energies = array('d')
+        self.spotify_valences = array('d')
+        self._feature_orders = {}  # Audio feature column -> (sorted known values, their song indexes), built on demand
+        self._numpy_columns = {}  # Attribute/audio feature column -> (NumPy values, known mask), built on demand
+        self.index_by_db_id = {}
+        self.search_blob = ''
+        self.search_starts = array('l')
+        self.trigrams = {}  # 3-character substring -> array of song indexes containing it
+        self._pending_texts = []  # Search texts not yet joined into search_blob
+        self._blob_length = 0
+        self.token_postings = {}  # word -> array of index * 3 + field (0 title, 1 artist, 2 album)
+        self._sorted_tokens = None  # Sorted vocabulary for prefix lookups, rebuilt when new words appear
+        self.tag_bitmaps = {}  # tag id -> int with bit i set when song i carries the tag
+        self._untagged_positions = None  # Sorted positions of songs without tags, built on demand
+        self.version = 0  # Bumped by every song, tag or attribute change so cached filter results go stale
+        self.change_id = 0  # Last SongChange already reflected here, so other workers' edits can be patched in
+        self.cache_id = uuid.uuid4().hex  # Identifies this store in module-level caches
+    
+    def append(self, spotify_id, db_id, position, name, artist, album, tag_ids=(), tempo=None, energy=None, mood=None,
+               spotify_tempo=None, spotify_energy=None, spotify_valence=None):
+        self.spotify_ids.append(spotify_id)
+        self.db_ids.append(db_id)
+        self.positions.append(position)
+        self.names.append(name)
+        self.artists.append(sys.intern(artist))
+        self.albums.append(sys.intern(album))
+        self.tag_ids.append(tuple(tag_ids))
+        self.tempos.append(tempo or 0)
+        self.energies.append(energy or 0)
+        self.moods.append(mood or 0)
+        self.spotify_tempos.append(nan_if_none(spotify_tempo))
+        self.spotify_energies.append(nan_if_none(spotify_energy))
+        self.spotify_valences.append(nan_if_none(spotify_valence))
+        
+        index = len(self.spotify_ids) - 1
+        self.index_by_db_id[db_id] = index
+        self.version += 1
+        self._feature_orders.clear()
+        self._numpy_columns.clear()
+        self._untagged_positions = None
+        bit = 1 << index
+        for tag_id in self.tag_ids[index]:
+            self.tag_bitmaps[tag_id] = self.tag_bitmaps.get(tag_id, 0) | bit
+        
+        search_text = fold_text(name + ' ' + artist).replace('\n', ' ')
+        self.search_starts.append(self._blob_length)
+        self._blob_length += len(search_text) + 1
+        self._pending_texts.append(search_text)
+        for gram in {search_text[i:i + 3] for i in range(len(search_text) - 2)}:
+            posting = self.trigrams.get(gram)
+            if posting is None:
+                posting = self.trigrams[gram] = array('i')
+            posting.append(index)
+        
+        for field, value in enumerate((name, artist, album)):
+            for token in set(search_tokens(value)):
+                posting = self.token_postings.get(token)
+                if posting is None:
+                    posting = self.token_postings[token] = array('i')
+                    self._sorted_tokens = None
+                posting.append(index * 3 + field)
+    
+    def append_track(self, track, saved_song, position):
+        """Add a Spotify track dict with its Song row"""
+        self.append(
+            track['id'],
+            saved_song.id,
+            position,
+            track['name'],
+            ', '.join([artist['name'] for artist in track['artists']]),
+            track['album']['name'],
+            [tag.id for tag in saved_song.tags],
+            saved_song.tempo,
+            saved_song.energy,
+            saved_song.mood,
+            saved_song.spotify_tempo,
+            saved_song.spotify_energy,
+            saved_song.spotify_valence
+        )
+    
+    def finish(self):
+        """Join any newly appended search texts onto the search blob"""
+        if self._pending_texts:
+            parts = [self.search_blob] if self.search_blob or len(self._pending_texts) < len(self) else []
+            self.search_blob = '\n'.join(parts + self._pending_texts)
+            self._pending_texts = []
+            # Appending dropped the NumPy columns and feature orders; build them now so the cache's size estimate includes them
+            if np is not None:
+                for column_name in NUMPY_FILTER_COLUMNS:
+                    self.numpy_column(column_name)
+            for store_column, song_column, param in AUDIO_FEATURE_FILTERS.values():
+                self.feature_range(store_column, 0, 0)
+        return self
+    
+    def search_text(self, index):
+        self.finish()
+        start = self.search_starts[index]
+        end = self.search_starts[index + 1] - 1 if index + 1 < len(self.search_starts) else len(self.search_blob)
+        return self.search_blob[start:end]
+    
+    def __len__(self):
+        return len(self.spotify_ids)
+    
+    def untagged_count(self):
+        return sum(1 for tag_ids in self.tag_ids if not tag_ids)
+    
+    def untagged_positions(self):
+        if self._untagged_positions is None:
+            # positions only ever grow with the index, so this comes out sorted
+            self._untagged_positions = array('l', [position for position, tag_ids in zip(self.positions, self.tag_ids)
+                                                   if not tag_ids])
+        return self._untagged_positions
+    
+    def next_untagged_position(self, offset):
+        """Position of the first untagged song after offset, or None"""
+        untagged = self.untagged_positions()
+        i = bisect.bisect_right(untagged, offset)
+        return untagged[i] if i < len(untagged) else None
+    
+    def prev_untagged_position(self, offset):
+        """Position of the last untagged song before offset, or None"""
+        untagged = self.untagged_positions()
+        i = bisect.bisect_left(untagged, offset)
+        return untagged[i - 1] if i > 0 else None
+    
+    def set_tags(self, index, tag_ids):
+        """Replace a song's tag ids; returns the change in untagged count (-1, 0 or 1)"""
+        self.version += 1
+        was_untagged = not self.tag_ids[index]
+        bit = 1 << index
+        for tag_id in self.tag_ids[index]:
+            self.tag_bitmaps[tag_id] &= ~bit
+        self.tag_ids[index] = tuple(tag_ids)
+        for tag_id in self.tag_ids[index]:
+            self.tag_bitmaps[tag_id] = self.tag_bitmaps.get(tag_id, 0) | bit
+        
+        is_untagged = not self.tag_ids[index]
+        if self._untagged_positions is not None and is_untagged != was_untagged:
+            position = self.positions[index]
+            i = bisect.bisect_left(self._untagged_positions, position)
+            if is_untagged:
+                self._untagged_positions.insert(i, position)
+            else:
+                del self._untagged_positions[i]
+        return int(is_untagged) - int(was_untagged)
+    
+    def set_attributes(self, index, tempo, energy, mood):
+        self.version += 1
+        for column_name, value in (('tempos', tempo), ('energies', energy), ('moods', mood)):
+            getattr(self, column_name)[index] = value or 0
+            if column_name in self._numpy_columns:
+                values, known = self._numpy_columns[column_name]
+                values[index] = value or 0
+                known[index] = bool(value)
+    
+    def set_audio_features(self, index, spotify_tempo, spotify_energy, spotify_valence):
+        self.version += 1
+        for column_name, value in (('spotify_tempos', spotify_tempo), ('spotify_energies', spotify_energy),
+                                   ('spotify_valences', spotify_valence)):
+            column = getattr(self, column_name)
+            old_value, new_value = column[index], nan_if_none(value)
+            column[index] = new_value
+            
+            order = self._feature_orders.get(column_name)
+            if order is None:
+                continue
+            # Move the song within the sorted order rather than re-sorting the whole column
+            values, indexes = order
+            if old_value == old_value:  # NaN (unknown) values aren't in the order
+                position = bisect.bisect_left(values, old_value)
+                while indexes[position] != index:
+                    position += 1
+                del values[position]
+                del indexes[position]
+            if new_value == new_value:
+                position = bisect.bisect_right(values, new_value)
+                values.insert(position, new_value)
+                indexes.insert(position, index)
+    
+    def feature_range(self, column_name, low, high):
+        """Indexes of songs whose audio feature lies in [low, high], via bisect on its sorted order (O(log n + k))"""
+        order = self._feature_orders.get(column_name)
+        if order is None:
+            column = getattr(self, column_name)
+            known = sorted((value, index) for index, value in enumerate(column) if value == value)
+            order = self._feature_orders[column_name] = (array('d', [value for value, index in known]),
+                                                         array('l', [index for value, index in known]))
+        values, indexes = order
+        return indexes[bisect.bisect_left(values, low):bisect.bisect_right(values, high)]
+    
+    def numpy_column(self, column_name):
+        """(values, known mask) of a manual attribute column as NumPy arrays.
+        
+        Built once and then kept in step by set_attributes, so
+        filters don't copy the column every time; appending a song drops them.
+        """
+        entry = self._numpy_columns.get(column_name)
+        if entry is None:
+            values = np.array(getattr(self, column_name), dtype=float)
+            # Manual attributes store 0 for not set
+            known = values != 0
+            entry = self._numpy_columns[column_name] = (values, known)
+        return entry
+    
+    def tag_filter_bitmap(self, include_tag_ids=(), exclude_tag_ids=()):
+        """Bitmap of songs carrying every include tag and none of the exclude tags"""
+        bitmap = (1 << len(self)) - 1
+        for tag_id in include_tag_ids:
+            bitmap &= self.tag_bitmaps.get(tag_id, 0)
+        for tag_id in exclude_tag_ids:
+            bitmap &= ~self.tag_bitmaps.get(tag_id, 0)
+        return bitmap
+    
+    def facet_counts(self, indexes):
+        """Per-tag and per-value (1-5) attribute counts within a result set, in one pass over it.
+        
+        A tag's count is how many songs the result would keep if that tag were
+        added as an include filter.
+        """
+        tag_counts = {}
+        buckets = {'tempo': [0] * 6, 'energy': [0] * 6, 'mood': [0] * 6}  # Slot 0 counts unset values
+        tempo_buckets, energy_buckets, mood_buckets = buckets['tempo'], buckets['energy'], buckets['mood']
+        untagged = 0
+        for index in indexes:
+            tag_ids = self.tag_ids[index]
+            if not tag_ids:
+                untagged += 1
+            for tag_id in tag_ids:
+                tag_counts[tag_id] = tag_counts.get(tag_id, 0) + 1
+            tempo_buckets[self.tempos[index]] += 1
+            energy_buckets[self.energies[index]] += 1
+            mood_buckets[self.moods[index]] += 1
+        
+        facets = {'tags': tag_counts, 'untagged': untagged}
+        for name, counts in buckets.items():
+            facets[name] = {value: counts[value] for value in range(1, 6)}
+        return facets
+    
+    def cached_filter_indexes(self, criteria):
+        """filter_indexes() through filter_result_cache (treat the returned array as read-only)"""
+        # change_id ties results to the persisted SongChange log, so edits made by other workers invalidate them too
+        key = (self.cache_id, self.change_id, self.version, normalize_filter_criteria(criteria))
+        indexes = filter_result_cache.get(key)
+        if indexes is None:
+            indexes = array('l', self.filter_indexes(criteria))
+            filter_result_cache.set(key, indexes)
+        return indexes
+    
+    def filter_indexes(self, criteria):
+        """Indexes of songs matching smart playlist style criteria (see filter_song_ids), in library order.
+        
+        Audio feature ranges are bisected out of sorted per-feature orders and
+        the narrowest one seeds the candidates. With NumPy available the
+        attribute ranges and tags then become vectorized masks over just those
+        candidates (or the whole library when no feature range is set);
+        otherwise tags are resolved with bitmap AND / AND-NOT and only the
+        songs surviving the tag filter have their ranges checked.
+        """
+        include_tag_ids = [int(tag_id) for tag_id in criteria.get('i', [])]
+        exclude_tag_ids = [int(tag_id) for tag_id in criteria.get('x', [])]
+        bitmap = self.tag_filter_bitmap(include_tag_ids, exclude_tag_ids)
+        
+        ranges = []
+        for key, column_name in FILTER_RANGE_COLUMNS.items():
+            value_range = criteria.get(key, FILTER_DEFAULT_RANGES[key])
+            ranges.append((column_name, float(value_range[0]), float(value_range[1])))
+        feature_ranges = [(store_column, *feature_range_bounds(criteria[key]))
+                          for key, (store_column, song_column, param) in AUDIO_FEATURE_FILTERS.items() if criteria.get(key)]
+        
+        feature_matches = sorted((self.feature_range(*feature_range) for feature_range in feature_ranges), key=len)
+        
+        if np is not None and len(self):
+            # Masks cover the feature candidates, or every song (a slice keeps the columns as views)
+            candidates = slice(None)
+            if feature_matches:
+                candidates = np.sort(np.asarray(feature_matches[0], dtype=np.int64))
+                for matches in feature_matches[1:]:
+                    candidates = np.intersect1d(candidates, np.asarray(matches, dtype=np.int64), assume_unique=True)
+            mask = np.ones(len(candidates) if feature_matches else len(self), dtype=bool)
+            for column_name, low, high in ranges:
+                values, known = self.numpy_column(column_name)
+                values = values[candidates]
+                mask &= known[candidates] & (values >= low) & (values <= high)
+            
+            if include_tag_ids or exclude_tag_ids:
+                # Unpack the tag bitmap (bit i = song i) into a boolean mask of the same shape
+                tag_bytes = np.frombuffer(bitmap.to_bytes((len(self) + 7) // 8, 'little'), dtype=np.uint8)
+                mask &= np.unpackbits(tag_bytes, bitorder='little')[:len(self)].astype(bool)[candidates]
+            if feature_matches:
+                return candidates[mask].tolist()
+            return np.flatnonzero(mask).tolist()
+        
+        columns = [(getattr(self, column_name), low, high) for column_name, low, high in ranges]
+        if feature_matches:
+            candidates = set(feature_matches[0])
+            for matches in feature_matches[1:]:
+                candidates.intersection_update(matches)
+            if include_tag_ids or exclude_tag_ids:
+                candidates.intersection_update(bitmap_indexes(bitmap))
+            return [index for index in sorted(candidates)
+                    if all(low <= column[index] <= high for column, low, high in columns)]
+        
+        # Unset values are stored as 0, below every valid range
+        return [index for index in bitmap_indexes(bitmap)
+                if all(low <= column[index] <= high for column, low, high in columns)]
+    
+    def search(self, query, limit=None, after=-1):
+        """Indexes of songs whose name/artist contains query, in library order.
+        
+        Queries of three or more characters intersect trigram posting lists and
+        only verify the surviving candidates; shorter ones scan the blob. Only
+        songs after index `after` are returned, so paging resumes where it left off.
+        """
+        query = fold_text(query)
+        if not query or '\n' in query:
+            return []
+        if len(query) < 3:
+            return self.scan(query, limit, after)
+        
+        postings = []
+        for gram in {query[i:i + 3] for i in range(len(query) - 2)}:
+            posting = self.trigrams.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        
+        # Start from the rarest trigram so the candidate set is small from the outset
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        
+        candidates = sorted(candidates)
+        matches = []
+        for index in candidates[bisect.bisect_right(candidates, after):]:
+            # Trigrams can all be present without forming the query, so check the text itself
+            if len(query) == 3 or query in self.search_text(index):
+                matches.append(index)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+    
+    def scan(self, query, limit=None, after=-1):
+        """Linear substring scan over the search blob (used for very short queries)"""
+        self.finish()
+        matches = []
+        if after + 1 >= len(self.search_starts):
+            return matches
+        start = self.search_blob.find(query, self.search_starts[after + 1])
+        while start != -1:
+            index = bisect.bisect_right(self.search_starts, start) - 1
+            matches.append(index)
+            if limit is not None and len(matches) >= limit:
+                break
+            # Carry on from the start of the next song so each song matches at most once
+            if index + 1 >= len(self.search_starts):
+                break
+            start = self.search_blob.find(query, self.search_starts[index + 1])
+        return matches
+    
+    def prefixed_tokens(self, query_token):
+        """Vocabulary words starting with query_token"""
+        sorted_tokens = self._sorted_tokens
+        if sorted_tokens is None:
+            sorted_tokens = self._sorted_tokens = sorted(self.token_postings)
+        
+        # All vocabulary words starting with query_token sit together in sorted order
+        i = bisect.bisect_left(sorted_tokens, query_token)
+        while i < len(sorted_tokens) and sorted_tokens[i].startswith(query_token):
+            yield sorted_tokens[i]
+            i += 1
+    
+    def ranked_scores(self, query):
+        """{index: score} for every song matching query.
+        
+        Every query word must match a word (or word prefix) in the title, artist
+        or album. Scores add up per word using SEARCH_FIELD_WEIGHTS.
+        """
+        query_tokens = search_tokens(query)
+        if not query_tokens:
+            return {}
+        
+        totals = None
+        for query_token in query_tokens:
+            token_scores = {}
+            for token in self.prefixed_tokens(query_token):
+                factor = 1.0 if token == query_token else SEARCH_PREFIX_FACTOR
+                for entry in self.token_postings[token]:
+                    index, field = divmod(entry, 3)
+                    score = SEARCH_FIELD_WEIGHTS[field] * factor
+                    if score > token_scores.get(index, 0):
+                        token_scores[index] = score
+            
+            if totals is None:
+                totals = token_scores
+            else:
+                totals = {index: totals[index] + score for index, score in token_scores.items() if index in totals}
+            if not totals:
+                return {}
+        return totals
+    
+    @staticmethod
+    def top_ranked(scores, limit=20):
+        """The `limit` best (index, score) pairs, best first, without sorting every match"""
+        # Ties go to the song that comes first in the library
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+    
+    def ranked_order(self, query):
+        """(indexes, scores) of every song matching query, best first, for pages past the first.
+        
+        Sorted once and kept in ranked_search_cache, so each further "Show more"
+        is a slice. Scores only depend on song text, which changes only as songs
+        are appended, hence the length in the key.
+        """
+        key = (self.cache_id, len(self), query)
+        ranked = ranked_search_cache.get(key)
+        if ranked is None:
+            scores = self.ranked_scores(query)
+            order = sorted(scores, key=lambda index: (-scores[index], index))
+            ranked = (array('l', order), array('d', (scores[index] for index in order)))
+            ranked_search_cache.set(key, ranked)
+        return ranked
+    
+    def song(self, index):
+        """Song at index in the dict shape the templates and JS expect"""
+        return {
+            'name': self.names[index],
+            'artist': self.artists[index],
+            'album': self.albums[index],
+            'spotify_id': self.spotify_ids[index],
+            'db_id': self.db_ids[index],
+            'position': self.positions[index],
+            'tags': resolve_tags(self.tag_ids[index])
+        }
+    
+    def filter_song(self, index):
+        """Song at index in the shape /filter-liked-songs returns"""
+        return {
+            'id': self.db_ids[index],
+            'spotify_id': self.spotify_ids[index],
+            'name': self.names[index],
+            'artist': self.artists[index],
+            'tempo': self.tempos[index],
+            'energy': self.energies[index],
+            'mood': self.moods[index],
+            'tags': [{'id': tag['id'], 'name': tag['name']} for tag in resolve_tags(self.tag_ids[index])]
+        }
+    
+    def rows(self):
+        """Compact rows for the persisted snapshot"""
+        return [[self.spotify_ids[i], self.db_ids[i], self.names[i], self.artists[i], self.albums[i], self.positions[i]]
+                for i in range(len(self))]
+
+
+# Shared tag id -> {'id', 'name', 'color'} table used to resolve LikedSongsStore tag ids
+tag_table = {}
+tag_table_lock = Lock()
+
+
+def refresh_tag_table():
+    """Reload the shared tag table from the database"""
+    new_table = {tag.id: {'id': tag.id, 'name': tag.name, 'color': tag.color} for tag in Tag.query.all()}
+    with tag_table_lock:
+        tag_table.clear()
+        tag_table.update(new_table)
+
+
+def resolve_tags(tag_ids):
+    """Turn a tuple of tag ids into the tag dicts the frontend expects"""
+    if any(tag_id not in tag_table for tag_id in tag_ids):
+        refresh_tag_table()
+    return [tag_table[tag_id] for tag_id in tag_ids if tag_id in tag_table]
+
+
+# Structured library queries, e.g. `artist:radiohead tag:rainy tempo:3-5 -tag:sad untagged`
+QUERY_TEXT_FIELDS = {'title': (0,), 'name': (0,), 'song': (0,), 'artist': (1,), 'album': (2,)}
+QUERY_ATTRIBUTE_FIELDS = {'tempo': 'tempos', 'energy': 'energies', 'mood': 'moods'}
+QUERY_TERM_PATTERN = re.compile(r'(-?)(?:(\w+):)?("[^"]*"?|\S+)')
+
+
+class QueryPredicate:
+    """One condition of a library query, optionally negated with a leading '-'"""
+    
+    indexed = False  # Whether candidates() and estimate() come from an index
+    
+    def __init__(self, term, negated=False):
+        self.term = term
+        self.negated = negated
+    
+    def estimate(self, store):
+        """Upper bound on how many songs match, used to order the plan"""
+        return len(store)
+    
+    def candidates(self, store):
+        """Set of matching indexes from an index, or None if this predicate can only filter"""
+        return None
+    
+    def matches(self, store, index):
+        raise NotImplementedError
+    
+    def __repr__(self):
+        return ('-' if self.negated else '') + self.term
+
+
+class TextPredicate(QueryPredicate):
+    """Every word must match a word (or word prefix) in one of the given fields"""
+    
+    indexed = True
+    
+    def __init__(self, term, tokens, fields, negated=False):
+        super().__init__(term, negated)
+        self.tokens = tokens
+        self.fields = fields
+    
+    def _postings(self, store, query_token):
+        return [store.token_postings[token] for token in store.prefixed_tokens(query_token)]
+    
+    def estimate(self, store):
+        return min(sum(len(posting) for posting in self._postings(store, query_token)) for query_token in self.tokens)
+    
+    def candidates(self, store):
+        result = None
+        for query_token in self.tokens:
+            indexes = set()  # Songs where this word matches in one of our fields
+            for posting in self._postings(store, query_token):
+                for entry in posting:
+                    index, field = divmod(entry, 3)
+                    if field in self.fields:
+                        indexes.add(index)
+            result = indexes if result is None else result & indexes
+            if not result:
+                break
+        return result
+    
+    def matches(self, store, index):
+        words = []
+        for field in self.fields:
+            words.extend(search_tokens((store.names, store.artists, store.albums)[field][index]))
+        return all(any(word.startswith(query_token) for word in words) for query_token in self.tokens)
 
-caching_in_progress = {}
-caching_lock = Lock()
 
-caching_progress = {}
+class TagPredicate(QueryPredicate):
+    """Song carries a tag with this name (case and accent insensitive)"""
+    
+    indexed = True
+    
+    def __init__(self, term, tag_name, negated=False):
+        super().__init__(term, negated)
+        self.tag_name = fold_text(tag_name)
+        self.tag_ids = None
+    
+    def resolve(self):
+        if self.tag_ids is None:
+            if not tag_table:
+                refresh_tag_table()
+            with tag_table_lock:
+                self.tag_ids = {tag_id for tag_id, tag in tag_table.items() if fold_text(tag['name']) == self.tag_name}
+        return self.tag_ids
+    
+    def estimate(self, store):
+        return bin(self.bitmap(store)).count('1')
+    
+    def bitmap(self, store):
+        bitmap = 0
+        for tag_id in self.resolve():
+            bitmap |= store.tag_bitmaps.get(tag_id, 0)
+        return bitmap
+    
+    def candidates(self, store):
+        return set(bitmap_indexes(self.bitmap(store)))
+    
+    def matches(self, store, index):
+        return not self.resolve().isdisjoint(store.tag_ids[index])
+
+
+class AttributePredicate(QueryPredicate):
+    """Manual 1-5 attribute within [low, high]; songs without the attribute never match"""
+    
+    def __init__(self, term, column, low, high, negated=False):
+        super().__init__(term, negated)
+        self.column = column
+        self.low = low
+        self.high = high
+    
+    def matches(self, store, index):
+        value = getattr(store, self.column)[index]
+        return value != 0 and self.low <= value <= self.high
+
+
+class UntaggedPredicate(QueryPredicate):
+    """Song has no tags (`tagged` is parsed as the negation)"""
+    
+    def matches(self, store, index):
+        return not store.tag_ids[index]
+
+
+def parse_attribute_range(value):
+    """'3' -> (3, 3), '3-5' -> (3, 5); raises ValueError outside 1-5"""
+    low, _, high = value.partition('-')
+    low, high = int(low), int(high or low)
+    if not 1 <= low <= high <= 5:
+        raise ValueError
+    return low, high
+
+
+class LibraryQuery:
+    """A parsed library query: the conjunction of its predicates.
+    
+    Parsing happens once; execute() then seeds the result from the most
+    selective predicate that has an index (text words or tag postings) and
+    checks the remaining predicates, cheapest estimate first, only against
+    those candidates.
+    """
+    
+    def __init__(self, predicates):
+        self.predicates = predicates
+    
+    @classmethod
+    def parse(cls, query):
+        predicates = []
+        for match in QUERY_TERM_PATTERN.finditer(query):
+            negated, field, value = match.group(1) == '-', match.group(2), match.group(3).strip('"')
+            term = match.group(0)
+            field_key = field.lower() if field else None
+            if field_key is None and value.lower() in ('untagged', 'tagged'):
+                predicates.append(UntaggedPredicate(term, negated != (value.lower() == 'tagged')))
+            elif field_key is None or field_key in QUERY_TEXT_FIELDS:
+                tokens = search_tokens(value)
+                if tokens:
+                    predicates.append(TextPredicate(term, tokens, QUERY_TEXT_FIELDS.get(field_key, (0, 1, 2)), negated))
+            elif field_key == 'tag':
+                if not value:
+                    raise ValueError(f"Missing tag name in '{term}'")
+                predicates.append(TagPredicate(term, value, negated))
+            elif field_key in QUERY_ATTRIBUTE_FIELDS:
+                try:
+                    low, high = parse_attribute_range(value)
+                except ValueError:
+                    raise ValueError(f"Invalid range in '{term}' (use a value or range between 1 and 5, e.g. {field_key}:3-5)")
+                predicates.append(AttributePredicate(term, QUERY_ATTRIBUTE_FIELDS[field_key], low, high, negated))
+            else:
+                # Not a field we know (e.g. a title like 're:birth'), so treat the whole term as words
+                tokens = search_tokens(match.group(2) + ' ' + value)
+                predicates.append(TextPredicate(term, tokens, (0, 1, 2), negated))
+        return cls(predicates)
+    
+    @property
+    def structured(self):
+        """Whether this needs the query engine rather than plain ranked search"""
+        return any(predicate.negated or not isinstance(predicate, TextPredicate) or predicate.fields != (0, 1, 2)
+                   for predicate in self.predicates)
+    
+    def plan(self, store):
+        """(seed predicate or None, remaining predicates in evaluation order)"""
+        def expected_matches(predicate):
+            if not predicate.indexed:
+                return len(store)
+            # A negated predicate keeps everything its positive form would reject
+            estimate = min(predicate.estimate(store), len(store))
+            return len(store) - estimate if predicate.negated else estimate
+        
+        estimates = {id(predicate): expected_matches(predicate) for predicate in self.predicates}
+        ordered = sorted(self.predicates, key=lambda predicate: estimates[id(predicate)])
+        seed = next((predicate for predicate in ordered if predicate.indexed and not predicate.negated), None)
+        return seed, [predicate for predicate in ordered if predicate is not seed]
+    
+    def execute(self, store, limit=None, after=-1):
+        """Indexes of matching songs after index `after`, in library order"""
+        seed, filters = self.plan(store)
+        print(f"DEBUG - Query plan: seed={seed}, filters={filters}")
+        if seed is not None:
+            candidates = sorted(seed.candidates(store))
+            candidates = candidates[bisect.bisect_right(candidates, after):]
+        else:
+            candidates = range(after + 1, len(store))
+        
+        matches = []
+        for index in candidates:
+            if all(predicate.matches(store, index) != predicate.negated for predicate in filters):
+                matches.append(index)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+
+def estimate_liked_songs_cache_size(cache_data):
+    """Rough in-memory size of a liked_songs_cache entry, in bytes"""
+    store = cache_data['songs']
+    size = sys.getsizeof(cache_data) + sys.getsizeof(store.search_blob)
+    size += sys.getsizeof(store.db_ids) + sys.getsizeof(store.positions) + sys.getsizeof(store.search_starts)
+    size += sys.getsizeof(store.tempos) + sys.getsizeof(store.energies) + sys.getsizeof(store.moods)
+    size += sys.getsizeof(store.spotify_tempos) + sys.getsizeof(store.spotify_energies) + sys.getsizeof(store.spotify_valences)
+    size += sys.getsizeof(store.index_by_db_id)
+    size += sum(values.nbytes + known.nbytes for values, known in store._numpy_columns.values())
+    size += sum(sys.getsizeof(values) + sys.getsizeof(indexes) for values, indexes in store._feature_orders.values())
+    size += sys.getsizeof(store.trigrams) + sum(sys.getsizeof(gram) + sys.getsizeof(posting) for gram, posting in store.trigrams.items())
+    size += sys.getsizeof(store.token_postings) + sum(sys.getsizeof(token) + sys.getsizeof(posting) for token, posting in store.token_postings.items())
+    size += sys.getsizeof(store.tag_bitmaps) + sum(sys.getsizeof(bitmap) for bitmap in store.tag_bitmaps.values())
+    for column in (store.spotify_ids, store.names, store.tag_ids):
+        size += sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+    # Interned strings are shared, so only count each distinct one once
+    for column in (store.artists, store.albums):
+        size += sys.getsizeof(column) + sum(sys.getsizeof(value) for value in set(column))
+    return size
+
+
+# Global cache storage (better than session for large data), bounded so long-running workers don't grow forever
+liked_songs_cache = BoundedCache(
+    max_entries=int(os.environ.get('LIKED_SONGS_CACHE_MAX_ENTRIES', 50)),
+    max_bytes=int(os.environ.get('LIKED_SONGS_CACHE_MAX_MB', 256)) * 1024 * 1024,
+    ttl=int(os.environ.get('LIKED_SONGS_CACHE_TTL', 6 * 3600)),
+    sizeof=estimate_liked_songs_cache_size
+)
+
+# A cache job still marked 'caching' without progress for this long died with its worker and may be restarted
+CACHE_JOB_STALE_AFTER = int(os.environ.get('CACHE_JOB_STALE_AFTER', 300))
+
+# How the cache build pages through saved tracks: 'parallel' or 'sequential'
+LIKED_SONGS_FETCH_MODE = os.environ.get('LIKED_SONGS_FETCH_MODE', 'parallel')
+LIKED_SONGS_FETCH_CONCURRENCY = int(os.environ.get('LIKED_SONGS_FETCH_CONCURRENCY', 4))
+
+# How long SongChange rows are kept; caches that fell further behind reload from the snapshot instead
+SONG_CHANGE_RETENTION = int(os.environ.get('SONG_CHANGE_RETENTION', 24 * 3600))
+# More changed songs than this and reloading the snapshot is cheaper than patching them one by one
+SONG_CHANGE_PATCH_LIMIT = int(os.environ.get('SONG_CHANGE_PATCH_LIMIT', 5000))
 
 # Association table for many-to-many relationship between songs and tags
 song_tags = db.Table('song_tags',
@@ -65,9 +1045,9 @@ class Song(db.Model):
     energy = db.Column(db.Integer, default=None)  # Default to Medium
     mood = db.Column(db.Integer, default=None)  # Default to Chill/Neutral (Valence)
     # NEW: Spotify audio features
-    spotify_tempo = db.Column(db.Float)  # BPM from Spotify
-    spotify_energy = db.Column(db.Float)  # 0-1 energy from Spotify
-    spotify_valence = db.Column(db.Float)  # 0-1 valence from Spotify
+    spotify_tempo = db.Column(db.Float, index=True)  # BPM from Spotify
+    spotify_energy = db.Column(db.Float, index=True)  # 0-1 energy from Spotify
+    spotify_valence = db.Column(db.Float, index=True)  # 0-1 valence from Spotify
     # Many-to-many relationship with tags
     tags = db.relationship('Tag', secondary=song_tags, backref='songs')
 
@@ -76,6 +1056,41 @@ class Tag(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
     color = db.Column(db.String(7), default='#1db954')  # Hex color for tag display
 
+class LikedSongsSnapshot(db.Model):
+    """Persisted liked-songs cache so every gunicorn worker (and restarts) can reuse it"""
+    id = db.Column(db.Integer, primary_key=True)
+    spotify_user_id = db.Column(db.String(100), unique=True, nullable=False)
+    cache_time = db.Column(db.Float, nullable=False)
+    total_songs = db.Column(db.Integer, default=0)
+    # zlib-compressed JSON: rows of [spotify_id, db_id, name, artist, album, position] in liked-songs order,
+    # plus the newest added_at and Spotify's total for incremental syncs
+    songs_data = db.Column(db.LargeBinary, nullable=False)
+
+class LikedSong(db.Model):
+    """Which songs each user has liked, so database search can be limited to them without a warm cache"""
+    spotify_user_id = db.Column(db.String(100), primary_key=True)
+    song_id = db.Column(db.Integer, db.ForeignKey('song.id'), primary_key=True)
+    position = db.Column(db.Integer, nullable=False)  # Offset in the user's Liked Songs when last synced
+
+class LikedSongsCacheJob(db.Model):
+    """State of each user's background cache build, shared by every worker so progress polls can land on any of them"""
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(120), unique=True, nullable=False)
+    job_id = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # 'caching', 'completed' or 'error'
+    progress = db.Column(db.Text, nullable=False)  # JSON: pages_fetched, total_pages, songs_cached, eta_seconds, ...
+    updated_at = db.Column(db.Float, nullable=False)
+
+class SongChange(db.Model):
+    """Log of songs whose tags or attributes changed, so every worker can patch its cached stores.
+    
+    Songs and tags are shared by all users, so this is one library-wide log and
+    its id doubles as the mutation counter.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    song_id = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.Float, nullable=False)
+
 
 @app.route('/backup-tags')
 def backup_tags():
@@ -88,22 +1103,63 @@ def backup_tags():
         return "No tags found"
 
 
-def save_song_to_db(spotify_track_data, sp=None):
-    """Save song to database if it doesn't already exist"""
-    existing_song = Song.query.filter_by(spotify_id=spotify_track_data['id']).first()
+# SQLite caps the number of bound parameters per statement, so IN queries are chunked
+DB_IN_CHUNK_SIZE = 500
+
+
+def save_songs_to_db(spotify_tracks):
+    """Save a whole page of Spotify track dicts in one transaction.
     
-    if not existing_song:
-        new_song = Song(
-            spotify_id=spotify_track_data['id'],
-            name=spotify_track_data['name'],
-            artist=', '.join([artist['name'] for artist in spotify_track_data['artists']]),
-            album=spotify_track_data['album']['name'],
-            duration_ms=spotify_track_data['duration_ms']
-        )
-        db.session.add(new_song)
-        db.session.commit()
-        return new_song
-    return existing_song
+    Existing songs are resolved with a single IN query, missing ones are added
+    with one multi-row insert, and a {spotify_id: Song} mapping is returned
+    (with tags already loaded).
+    """
+    tracks_by_id = {}
+    for track in spotify_tracks:
+        # Playlist items can be null and local files have no Spotify ID
+        if track and track.get('id'):
+            tracks_by_id[track['id']] = track
+    
+    if not tracks_by_id:
+        return {}
+    
+    spotify_ids = list(tracks_by_id.keys())
+    
+    for attempt in range(2):
+        existing_ids = set()
+        for i in range(0, len(spotify_ids), DB_IN_CHUNK_SIZE):
+            chunk = spotify_ids[i:i + DB_IN_CHUNK_SIZE]
+            existing_ids.update(row[0] for row in db.session.query(Song.spotify_id).filter(Song.spotify_id.in_(chunk)))
+        
+        new_rows = [{
+            'spotify_id': spotify_id,
+            'name': tracks_by_id[spotify_id]['name'],
+            'artist': ', '.join([artist['name'] for artist in tracks_by_id[spotify_id]['artists']]),
+            'album': tracks_by_id[spotify_id]['album']['name'],
+            'duration_ms': tracks_by_id[spotify_id]['duration_ms']
+        } for spotify_id in spotify_ids if spotify_id not in existing_ids]
+        
+        if not new_rows:
+            break
+        
+        try:
+            db.session.execute(Song.__table__.insert(), new_rows)
+            db.session.commit()
+            print(f"DEBUG - Bulk inserted {len(new_rows)} new songs")
+            break
+        except IntegrityError:
+            # Another worker inserted some of these between our SELECT and INSERT - look again
+            db.session.rollback()
+            if attempt == 1:
+                raise
+    
+    songs_by_spotify_id = {}
+    for i in range(0, len(spotify_ids), DB_IN_CHUNK_SIZE):
+        chunk = spotify_ids[i:i + DB_IN_CHUNK_SIZE]
+        for song in Song.query.options(selectinload(Song.tags)).filter(Song.spotify_id.in_(chunk)):
+            songs_by_spotify_id[song.spotify_id] = song
+    
+    return songs_by_spotify_id
 
 
 @app.route('/get-audio-features/<int:song_id>')
@@ -116,7 +1172,11 @@ def get_audio_features(song_id):
     if not song:
         return {'error': 'Song not found'}, 404
     
-    # Return cached features if we have them
+    return fetch_audio_features(song)
+
+
+def stored_audio_features(song):
+    """A song's audio features as /get-audio-features returns them if already stored, else None"""
     if song.spotify_tempo is not None and song.spotify_energy is not None and song.spotify_valence is not None:
         return {
             'tempo': song.spotify_tempo,
@@ -124,6 +1184,26 @@ def get_audio_features(song_id):
             'valence': song.spotify_valence,
             'cached': True
         }
+    return None
+
+
+# Spotify ids ReccoBeats had no audio features for, so neither the warmer nor page loads keep asking for them
+audio_features_missing = BoundedCache(
+    max_entries=int(os.environ.get('AUDIO_FEATURES_MISSING_MAX_ENTRIES', 10000)),
+    ttl=int(os.environ.get('AUDIO_FEATURES_MISSING_TTL', 86400)),
+    name='missing audio features'
+)
+
+
+def fetch_audio_features(song):
+    """A song's audio features as /get-audio-features returns them, looked up from ReccoBeats the first time"""
+    # Return cached features if we have them
+    features = stored_audio_features(song)
+    if features is not None:
+        return features
+    
+    if song.spotify_id in audio_features_missing:
+        return {'error': 'No features found'}
     
     # Fetch from reccobeats API
     try:
@@ -138,7 +1218,9 @@ def get_audio_features(song_id):
             song.spotify_tempo = f.get("tempo")
             song.spotify_energy = f.get("energy")
             song.spotify_valence = f.get("valence")
+            record_song_changes([song.id])
             db.session.commit()
+            write_through_song(song)
             
             return {
                 'tempo': song.spotify_tempo,
@@ -147,10 +1229,11 @@ def get_audio_features(song_id):
                 'cached': False
             }
         else:
+            audio_features_missing.set(song.spotify_id, True)
             return {'error': 'No features found'}
             
     except Exception as e:
-        print(f"Error fetching audio features for song {song_id}: {e}")
+        print(f"Error fetching audio features for song {song.id}: {e}")
         return {'error': str(e)}
     
 
@@ -195,7 +1278,9 @@ def update_song_attributes():
     if mood is not None:
         song.mood = int(mood)
     
+    record_song_changes([song.id])
     db.session.commit()
+    write_through_song(song)
     print(f"DEBUG - Song attributes updated successfully")
     
     return {'success': True, 'tempo': song.tempo, 'energy': song.energy, 'mood': song.mood}
@@ -253,6 +1338,13 @@ def callback():
     code = request.args.get('code')
     token_info = sp_oauth.get_access_token(code)
     session['token_info'] = token_info
+    
+    # Resolve the Spotify user once per login - it's what the liked songs cache is keyed on
+    try:
+        session['spotify_user_id'] = spotipy.Spotify(auth=token_info['access_token']).current_user()['id']
+    except Exception as e:
+        print(f"ERROR - Failed to look up Spotify user at login: {e}")
+    
     return redirect(url_for('spotify'))
 
 
@@ -291,12 +1383,12 @@ def view_playlist(playlist_id):
         results = sp.playlist_tracks(playlist_id)
         
         while results:
+            # Save the whole page to the database in one go
+            saved_songs = save_songs_to_db([item['track'] for item in results['items']])
+            
             for item in results['items']:
-                
-                # Save song to database
-                saved_song = save_song_to_db(item['track'], sp)
-
-                if item['track']:  # Check if track exists (sometimes it can be null)
+                if item['track'] and item['track']['id'] in saved_songs:  # Check if track exists (sometimes it can be null)
+                    saved_song = saved_songs[item['track']['id']]
                     track_info = {
                         'name': item['track']['name'],
                         'artist': ', '.join([artist['name'] for artist in item['track']['artists']]),
@@ -389,7 +1481,9 @@ def add_tag():
     # Add tag to song if not already there
     if tag not in song.tags:
         song.tags.append(tag)
+        record_song_changes([song.id])
         db.session.commit()
+        write_through_song(song)
         print(f"DEBUG - Tag added successfully! Song now has {len(song.tags)} tags")
     else:
         print("DEBUG - Tag already exists on this song")
@@ -421,7 +1515,9 @@ def remove_tag():
     
     if song and tag and tag in song.tags:
         song.tags.remove(tag)
+        record_song_changes([song.id])
         db.session.commit()
+        write_through_song(song)
         print(f"DEBUG - Removed tag {tag.name} from song {song.name}")
     
     # Return JSON for AJAX requests
@@ -467,6 +1563,245 @@ def get_song_tags(song_id):
     return {'tags': tags_data}
 
 
+# Sliding window of saved-track pages for the tagging flow, per user
+SAVED_TRACKS_PAGE_SIZE = 50
+SAVED_TRACKS_WINDOW_AHEAD = int(os.environ.get('SAVED_TRACKS_WINDOW_AHEAD', 3))  # Pages kept (and prefetched) past the cursor's page
+SAVED_TRACKS_WINDOW_BEHIND = int(os.environ.get('SAVED_TRACKS_WINDOW_BEHIND', 1))  # Pages kept before it, for going back
+SAVED_TRACKS_PAGE_TTL = int(os.environ.get('SAVED_TRACKS_PAGE_TTL', 300))  # Newly liked songs shift positions, so pages go stale
+
+saved_tracks_prefetch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('SAVED_TRACKS_PREFETCH_WORKERS', 2)))
+
+
+class SavedTracksWindow:
+    """Pages of one user's saved tracks around the tagging cursor.
+    
+    Pages are kept already upserted, so every entry carries its Song db id
+    (None for null tracks). Sliding the window to a page drops pages that fell
+    out of it and fetches the missing ones ahead in the background, so stepping
+    through songs normally never waits on Spotify.
+    """
+    
+    def __init__(self):
+        self.pages = {}  # page offset -> (fetched_at, entries, is_last_page)
+        self.pending = {}  # page offset -> Future of a background fetch
+        self.lock = Lock()
+        self.access_token = None  # Latest token from the user's requests, used by the background fetches
+        self.warm_target = None  # (position, untagged_only, count) the song bundle warmer should work on next
+        self.warming = False  # Whether a warm_song_bundles task is queued or running for this window
+    
+    def fetch(self, page_offset):
+        """Fetch one page from Spotify and upsert its songs (needs an app context)"""
+        results = spotipy.Spotify(auth=self.access_token).current_user_saved_tracks(limit=SAVED_TRACKS_PAGE_SIZE, offset=page_offset)
+        saved_songs = save_songs_to_db([item['track'] for item in results['items']])
+        
+        entries = []
+        for item in results['items']:
+            track = item['track']
+            if not track or track.get('id') not in saved_songs:
+                entries.append(None)
+                continue
+            entries.append({
+                'spotify_id': track['id'],
+                'db_id': saved_songs[track['id']].id,
+                'name': track['name'],
+                'artist': ', '.join([artist['name'] for artist in track['artists']]),
+                'album': track['album']['name'],
+                'duration_ms': track['duration_ms']
+            })
+        
+        page = (time.time(), entries, not results['next'])
+        with self.lock:
+            self.pages[page_offset] = page
+        return page
+    
+    def prefetch(self, page_offset):
+        with app.app_context():
+            try:
+                self.fetch(page_offset)
+                print(f"DEBUG - Prefetched saved tracks page at offset {page_offset}")
+            except Exception as e:
+                print(f"DEBUG - Prefetching saved tracks page at offset {page_offset} failed: {e}")
+            finally:
+                with self.lock:
+                    self.pending.pop(page_offset, None)
+    
+    def page(self, page_offset):
+        """(fetched_at, entries, is_last_page) for a page, waiting for an in-flight prefetch rather than fetching twice.
+        
+        A prefetch still queued behind other pages in the shared executor is
+        cancelled and the page fetched right away instead.
+        """
+        with self.lock:
+            page = self.pages.get(page_offset)
+            future = self.pending.get(page_offset)
+        if (page is None or time.time() - page[0] > SAVED_TRACKS_PAGE_TTL) and future is not None:
+            if future.cancel():
+                with self.lock:
+                    if self.pending.get(page_offset) is future:
+                        del self.pending[page_offset]
+            else:
+                future.result()
+                with self.lock:
+                    page = self.pages.get(page_offset)
+        if page is None or time.time() - page[0] > SAVED_TRACKS_PAGE_TTL:
+            print(f"DEBUG - Saved tracks window miss at offset {page_offset}")
+            page = self.fetch(page_offset)
+        return page
+    
+    def slide(self, page_offset):
+        """Move the window to the page at page_offset and start refilling the pages ahead of it"""
+        low = page_offset - SAVED_TRACKS_WINDOW_BEHIND * SAVED_TRACKS_PAGE_SIZE
+        high = page_offset + SAVED_TRACKS_WINDOW_AHEAD * SAVED_TRACKS_PAGE_SIZE
+        now = time.time()
+        with self.lock:
+            # Nothing to prefetch past the end of the library
+            last_offsets = [offset for offset, page in self.pages.items() if page[2]]
+            end = min(last_offsets) if last_offsets else high
+            for stale_offset in [offset for offset in self.pages if offset < low or offset > high]:
+                del self.pages[stale_offset]
+            missing = [offset for offset in range(page_offset + SAVED_TRACKS_PAGE_SIZE, min(high, end) + 1, SAVED_TRACKS_PAGE_SIZE)
+                       if offset not in self.pending and
+                       (offset not in self.pages or now - self.pages[offset][0] > SAVED_TRACKS_PAGE_TTL)]
+            for offset in missing:
+                self.pending[offset] = saved_tracks_prefetch_executor.submit(self.prefetch, offset)
+    
+    def find(self, position, untagged_only=False, max_search=200, slide=True):
+        """First saved track at or after position, skipping tagged songs if untagged_only.
+        
+        Returns (position, entry), or (None, reached_end) when nothing matched
+        within max_search songs. With slide the window then moves to where the
+        search stopped.
+        """
+        page_offset = position - position % SAVED_TRACKS_PAGE_SIZE
+        songs_examined = 0
+        
+        while True:
+            fetched_at, entries, is_last_page = self.page(page_offset)
+            candidates = [(page_offset + i, entry) for i, entry in enumerate(entries)
+                          if entry and page_offset + i >= position]
+            
+            # Tags change all the time, so they come from the database rather than the window
+            tagged_ids = set()
+            if untagged_only and candidates:
+                tagged_ids = {row[0] for row in db.session.query(song_tags.c.song_id).filter(
+                    song_tags.c.song_id.in_([entry['db_id'] for _, entry in candidates])).distinct()}
+            
+            for actual_position, entry in candidates:
+                songs_examined += 1
+                if entry['db_id'] not in tagged_ids:
+                    if slide:
+                        self.slide(page_offset)
+                    return actual_position, entry
+                if songs_examined >= max_search:
+                    if slide:
+                        self.slide(page_offset)
+                    return None, False
+            
+            if is_last_page or not entries:
+                return None, True
+            page_offset += SAVED_TRACKS_PAGE_SIZE
+
+
+saved_tracks_windows = BoundedCache(
+    max_entries=int(os.environ.get('SAVED_TRACKS_WINDOW_MAX_USERS', 100)),
+    ttl=int(os.environ.get('SAVED_TRACKS_WINDOW_TTL', 1800)),
+    name='saved tracks window'
+)
+saved_tracks_windows_lock = Lock()  # So concurrent first requests from one user share a single window
+
+
+def get_saved_tracks_window():
+    """The current user's saved tracks window, created on first use"""
+    cache_key = get_cache_key()
+    with saved_tracks_windows_lock:
+        window = saved_tracks_windows.get(cache_key)
+        if window is None:
+            window = SavedTracksWindow()
+            saved_tracks_windows.set(cache_key, window)
+    window.access_token = session['token_info']['access_token']
+    return window
+
+
+def find_saved_track(position, untagged_only=False, max_search=200):
+    """SavedTracksWindow.find on the current user's window"""
+    return get_saved_tracks_window().find(position, untagged_only=untagged_only, max_search=max_search)
+
+
+def format_duration(duration_ms):
+    minutes = duration_ms // 60000
+    seconds = (duration_ms % 60000) // 1000
+    return f"{minutes}:{seconds:02d}"
+
+
+# Song bundles for the tagging view are read fresh from the database on every request, so tag and
+# attribute edits from any worker show up at once. Looking up missing audio features (a slow external
+# call) only ever happens in the background warmer, never on the navigation path.
+SONG_BUNDLE_WARM_AHEAD = int(os.environ.get('SONG_BUNDLE_WARM_AHEAD', 3))  # Upcoming songs warmed after each load
+# Separate from the page prefetcher, since warming waits on its fetches
+song_bundle_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('SONG_BUNDLE_WARM_WORKERS', 1)))
+
+
+def get_song_bundle(song_id):
+    """Tags, attribute status and stored audio features of a song.
+    
+    audio_features is None until they have been looked up; the page then loads them lazily.
+    """
+    song = Song.query.get(song_id)
+    if not song:
+        return None
+    
+    return {
+        'tags': [{'id': tag.id, 'name': tag.name, 'color': tag.color} for tag in song.tags],
+        'attributes': {
+            'tempo': song.tempo,
+            'energy': song.energy,
+            'mood': song.mood,
+            'is_unset': song.tempo is None and song.energy is None and song.mood is None
+        },
+        'audio_features': stored_audio_features(song)
+    }
+
+
+def queue_song_bundle_warm(window, position, untagged_only, count):
+    """Point the window's warmer at the songs after position, submitting it only if none is queued or running.
+    
+    A warm already in progress picks up the new position instead, so
+    navigating quickly never stacks up warms for positions the user has left.
+    """
+    with window.lock:
+        window.warm_target = (position, untagged_only, count)
+        if window.warming:
+            return
+        window.warming = True
+    song_bundle_executor.submit(warm_song_bundles, window)
+
+
+def warm_song_bundles(window):
+    """Background: look up the audio features of the songs after the window's latest warm target, so their bundles arrive complete"""
+    with app.app_context():
+        while True:
+            with window.lock:
+                target, window.warm_target = window.warm_target, None
+                if target is None:
+                    window.warming = False
+                    return
+            position, untagged_only, count = target
+            try:
+                for _ in range(count):
+                    if window.warm_target is not None:
+                        break  # The user moved on; start over from the new position
+                    # Looking ahead mustn't move the window away from where the user actually is
+                    position, entry = window.find(position + 1, untagged_only=untagged_only, max_search=50, slide=False)
+                    if position is None:
+                        break
+                    song = Song.query.get(entry['db_id'])
+                    if song and stored_audio_features(song) is None:
+                        fetch_audio_features(song)
+            except Exception as e:
+                print(f"DEBUG - Warming song bundles after position {position} failed: {e}")
+                db.session.rollback()
+
+
 @app.route('/tag-liked-songs')
 def tag_liked_songs():
     """Show liked songs tagging within main spotify page"""
@@ -514,71 +1849,33 @@ def tag_liked_songs():
             print(f"ERROR - Failed to load playlists: {playlist_error}")
             playlist_list = []
         
-        # Find the current song logic (same as before)
-        current_position = offset
-        songs_examined = 0
-        max_search = 200
+        # Find the current song through the saved tracks window
+        actual_position, entry = find_saved_track(offset, untagged_only=untagged_only)
         
-        while songs_examined < max_search:
-            results = sp.current_user_saved_tracks(limit=50, offset=current_position)
+        if actual_position is not None:
+            print(f"DEBUG - Found matching song at position {actual_position}")
+            saved_song = Song.query.get(entry['db_id'])
+            queue_song_bundle_warm(get_saved_tracks_window(), actual_position, untagged_only, SONG_BUNDLE_WARM_AHEAD)
             
-            if not results['items']:
-                # No more songs
-                return render_template('spotify.html',
-                                     authenticated=True,
-                                     playlists=playlist_list,
-                                     liked_songs_mode=True,
-                                     no_more_songs=True,
-                                     offset=offset,
-                                     untagged_only=untagged_only)
-            
-            # Look through this batch
-            for i, item in enumerate(results['items']):
-                if item['track']:
-                    actual_position = current_position + i
-                    songs_examined += 1
-                    
-                    print(f"DEBUG - Examining position {actual_position}: {item['track']['name']}")
-                    
-                    saved_song = save_song_to_db(item['track'])
-                    
-                    if untagged_only and len(saved_song.tags) > 0:
-                        print(f"DEBUG - Skipping tagged song at position {actual_position}")
-                        continue
-                    
-                    print(f"DEBUG - Found matching song at position {actual_position}")
-                    
-                    # Format the song data
-                    duration_ms = item['track']['duration_ms']
-                    minutes = duration_ms // 60000
-                    seconds = (duration_ms % 60000) // 1000
-                    duration_formatted = f"{minutes}:{seconds:02d}"
-                    
-                    current_song = {
-                        'name': item['track']['name'],
-                        'artist': ', '.join([artist['name'] for artist in item['track']['artists']]),
-                        'album': item['track']['album']['name'],
-                        'duration': duration_formatted,
-                        'id': item['track']['id'],
-                        'db_id': saved_song.id,
-                        'tags': saved_song.tags,
-                        'actual_position': actual_position
-                    }
-                    
-                    return render_template('spotify.html',
-                                         authenticated=True,
-                                         playlists=playlist_list,
-                                         liked_songs_mode=True,
-                                         current_song=current_song,
-                                         offset=actual_position,
-                                         untagged_only=untagged_only,
-                                         no_more_songs=False)
-            
-            # No matching song in this batch, get next batch
-            if results['next']:
-                current_position += 50
-            else:
-                break
+            current_song = {
+                'name': entry['name'],
+                'artist': entry['artist'],
+                'album': entry['album'],
+                'duration': format_duration(entry['duration_ms']),
+                'id': entry['spotify_id'],
+                'db_id': entry['db_id'],
+                'tags': saved_song.tags,
+                'actual_position': actual_position
+            }
+            
+            return render_template('spotify.html',
+                                 authenticated=True,
+                                 playlists=playlist_list,
+                                 liked_songs_mode=True,
+                                 current_song=current_song,
+                                 offset=actual_position,
+                                 untagged_only=untagged_only,
+                                 no_more_songs=False)
         
         # If we get here, no matching songs found
         return render_template('spotify.html',
@@ -660,11 +1957,13 @@ def delete_tag():
         
         # Remove tag from all songs (the many-to-many relationship handles this)
         # Clear all associations first
+        record_song_changes([song.id for song in tag.songs])
         tag.songs.clear()
         
         # Delete the tag itself
         db.session.delete(tag)
         db.session.commit()
+        write_through_tag_deleted(int(tag_id))
         
         print(f"DEBUG - Successfully deleted tag: {tag_name}")
         return {'success': True, 'message': f'Tag "{tag_name}" deleted successfully'}
@@ -676,210 +1975,949 @@ def delete_tag():
     
 
 
-@app.route('/cache-liked-songs')
-def cache_liked_songs():
-    """Pre-load and cache all liked songs for fast searching"""
-    if 'token_info' not in session:
-        return {'error': 'Not authenticated'}, 401
+def iter_saved_track_pages(access_token, limit=50, fetch_mode=None, concurrency=None):
+    """Yield (offset, page) for the user's saved tracks, always in position order.
     
-    # Use session-based cache key instead of token hash
-    if 'cache_key' not in session:
-        user_token = session['token_info']['access_token']
-        session['cache_key'] = f"user_{hash(user_token[:20]) % 10000}_{int(time.time() / 3600)}"  # Stable for 1 hour
+    In 'parallel' mode the first page tells us the total, and the remaining
+    offsets are fetched concurrently by up to `concurrency` threads.
+    """
+    fetch_mode = fetch_mode or LIKED_SONGS_FETCH_MODE
+    concurrency = concurrency or LIKED_SONGS_FETCH_CONCURRENCY
     
-    cache_key = session['cache_key']
-    print(f"DEBUG - Using cache key: {cache_key}")
+    sp = spotipy.Spotify(auth=access_token)
+    offset = 0
+    page = sp.current_user_saved_tracks(limit=limit, offset=offset)
+    yield offset, page
     
-    # Check if caching is already in progress for this user
-    with caching_lock:
-        if cache_key in caching_in_progress:
-            print(f"DEBUG - Caching already in progress for user {cache_key}")
-            return {
-                'status': 'caching_in_progress', 
-                'message': 'Cache operation already running',
-                'count': 0,
-                'total_songs': 0,
-                'total_untagged': 0
-            }
-        
-        # Mark caching as in progress
-        caching_in_progress[cache_key] = True
-        print(f"DEBUG - Starting cache operation for user {cache_key}")
+    if fetch_mode == 'parallel' and concurrency > 1 and page['next']:
+        total = page.get('total') or 0
+        offsets = list(range(limit, total, limit))
+        
+        def fetch_page(page_offset):
+            # One client per call - spotipy clients share a requests session
+            return spotipy.Spotify(auth=access_token).current_user_saved_tracks(limit=limit, offset=page_offset)
+        
+        print(f"DEBUG - Fetching {len(offsets)} remaining pages with {concurrency} workers")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # map() returns results in submission order, so pages come back in position order
+            for offset, page in zip(offsets, executor.map(fetch_page, offsets)):
+                yield offset, page
+    
+    # Sequential mode, or songs were liked while the parallel fetch was running
+    while page['items'] and page['next']:
+        offset += limit
+        page = sp.current_user_saved_tracks(limit=limit, offset=offset)
+        if not page['items']:
+            break
+        yield offset, page
+
+
+def get_spotify_user_id():
+    """Spotify user id for the current session (looked up once, then kept in the session)"""
+    if 'spotify_user_id' not in session:
+        sp = spotipy.Spotify(auth=session['token_info']['access_token'])
+        session['spotify_user_id'] = sp.current_user()['id']
+    return session['spotify_user_id']
+
+
+def get_cache_key():
+    """Key of the current user's entry in liked_songs_cache.
+    
+    Based on the Spotify user id, so re-logins, other tabs and refreshed tokens
+    all share the same warm cache.
+    """
+    return f"user_{get_spotify_user_id()}"
+
+
+def save_liked_songs_snapshot(spotify_user_id, cached_songs, cache_time, newest_added_at=None, spotify_total=None):
+    """Write the liked-songs cache to the database for other workers and future restarts"""
+    rows = cached_songs.rows()
+    payload = {'rows': rows, 'newest_added_at': newest_added_at, 'spotify_total': spotify_total}
+    songs_data = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    
+    snapshot = LikedSongsSnapshot.query.filter_by(spotify_user_id=spotify_user_id).first()
+    if not snapshot:
+        snapshot = LikedSongsSnapshot(spotify_user_id=spotify_user_id)
+        db.session.add(snapshot)
+    snapshot.cache_time = cache_time
+    snapshot.total_songs = len(rows)
+    snapshot.songs_data = songs_data
+    # Replace the user's liked songs in the same transaction, dropping any that were un-liked
+    LikedSong.query.filter_by(spotify_user_id=spotify_user_id).delete()
+    record_liked_songs(spotify_user_id, [(row[1], row[5]) for row in rows], commit=False)
+    db.session.commit()
+    print(f"DEBUG - Saved liked songs snapshot for {spotify_user_id}: {len(rows)} songs, {len(songs_data)} bytes")
+
+
+def record_liked_songs(spotify_user_id, songs, commit=True):
+    """Upsert (song_id, position) pairs into the user's LikedSong rows"""
+    if songs:
+        db.session.execute(LikedSong.__table__.insert().prefix_with('OR REPLACE'),
+                           [{'spotify_user_id': spotify_user_id, 'song_id': song_id, 'position': position}
+                            for song_id, position in songs])
+    if commit:
+        db.session.commit()
+
+
+def load_song_states():
+    """Current tags and attributes of every song, as ({song_id: [tag_id]}, {song_id: [tempo, energy, mood,
+    spotify_tempo, spotify_energy, spotify_valence]}), in two queries instead of touching song.tags per song"""
+    tag_ids_by_song_id = {}
+    for song_id, tag_id in db.session.query(song_tags.c.song_id, song_tags.c.tag_id):
+        tag_ids_by_song_id.setdefault(song_id, []).append(tag_id)
+    refresh_tag_table()
+    
+    # Only songs with something set
+    attributes_by_song_id = {}
+    attribute_rows = db.session.query(Song.id, Song.tempo, Song.energy, Song.mood,
+                                      Song.spotify_tempo, Song.spotify_energy, Song.spotify_valence).filter(
+        (Song.tempo.isnot(None)) | (Song.energy.isnot(None)) | (Song.mood.isnot(None)) |
+        (Song.spotify_tempo.isnot(None)) | (Song.spotify_energy.isnot(None)) | (Song.spotify_valence.isnot(None)))
+    for song_id, *attributes in attribute_rows:
+        attributes_by_song_id[song_id] = attributes
+    return tag_ids_by_song_id, attributes_by_song_id
+
+
+def load_liked_songs_snapshot(spotify_user_id):
+    """Rebuild a liked_songs_cache entry from the persisted snapshot (tags come fresh from the DB)"""
+    snapshot = LikedSongsSnapshot.query.filter_by(spotify_user_id=spotify_user_id).first()
+    if not snapshot:
+        return None
+    
+    payload = json.loads(zlib.decompress(snapshot.songs_data).decode('utf-8'))
+    if isinstance(payload, list):
+        # Snapshots written before incremental sync only stored the rows
+        payload = {'rows': payload}
+    rows = payload['rows']
+    
+    change_id = latest_song_change_id()  # Before reading, so changes made meanwhile get patched in later
+    tag_ids_by_song_id, attributes_by_song_id = load_song_states()
+    
+    cached_songs = LikedSongsStore()
+    cached_songs.change_id = change_id
+    for index, row in enumerate(rows):
+        spotify_id, db_id, name, artist, album = row[:5]
+        # Older snapshots didn't store positions
+        position = row[5] if len(row) > 5 else index
+        cached_songs.append(spotify_id, db_id, position, name, artist, album,
+                            tag_ids_by_song_id.get(db_id, ()), *attributes_by_song_id.get(db_id, ()))
+    cached_songs.finish()
+    
+    print(f"DEBUG - Loaded liked songs snapshot for {spotify_user_id}: {len(cached_songs)} songs")
+    return {
+        'songs': cached_songs,
+        'cache_time': snapshot.cache_time,
+        'total_songs': len(cached_songs),
+        'total_untagged': cached_songs.untagged_count(),
+        'spotify_user_id': spotify_user_id,
+        'newest_added_at': payload.get('newest_added_at'),
+        'spotify_total': payload.get('spotify_total')
+    }
+
+
+def get_liked_songs_cache():
+    """Current user's liked songs cache entry, falling back to the persisted snapshot.
+    
+    Returns None if neither this worker nor the database has a copy.
+    """
+    spotify_user_id = get_spotify_user_id()
+    cache_key = get_cache_key()
+    
+    cache_data = liked_songs_cache.get(cache_key)
+    
+    # Another worker may have rebuilt the snapshot since we last loaded it
+    snapshot_time = db.session.query(LikedSongsSnapshot.cache_time).filter_by(spotify_user_id=spotify_user_id).scalar()
+    if snapshot_time is None or (cache_data and cache_data['cache_time'] >= snapshot_time):
+        # ...or changed tags and attributes since we last looked
+        if cache_data is None or sync_song_changes(cache_data):
+            return cache_data
+        if snapshot_time is None:
+            liked_songs_cache.pop(cache_key)
+            return None
+    
+    cache_data = load_liked_songs_snapshot(spotify_user_id)
+    if cache_data:
+        liked_songs_cache.set(cache_key, cache_data)
+    return cache_data
+
+
+def record_song_changes(song_ids):
+    """Log songs whose tags or attributes are about to change, in the caller's transaction"""
+    now = time.time()
+    for song_id in set(song_ids):
+        db.session.add(SongChange(song_id=song_id, changed_at=now))
+    # Trim the log, always keeping the newest row so ids never get reused
+    newest_id = db.session.query(func.max(SongChange.id)).scalar_subquery()
+    SongChange.query.filter(SongChange.changed_at < now - SONG_CHANGE_RETENTION,
+                            SongChange.id < newest_id).delete(synchronize_session=False)
+
+
+def latest_song_change_id():
+    return db.session.query(func.max(SongChange.id)).scalar() or 0
+
+
+def apply_song_to_cache(cache_data, song):
+    """Copy a song's current tags and attributes into one cache entry's store, if it holds the song"""
+    store = cache_data['songs']
+    index = store.index_by_db_id.get(song.id)
+    if index is None:
+        return
+    cache_data['total_untagged'] += store.set_tags(index, [tag.id for tag in song.tags])
+    store.set_attributes(index, song.tempo, song.energy, song.mood)
+    store.set_audio_features(index, song.spotify_tempo, song.spotify_energy, song.spotify_valence)
+
+
+def sync_song_changes(cache_data):
+    """Patch a cache entry with tag and attribute changes any worker committed since it last looked.
+    
+    Returns False when the change log no longer reaches back that far (or
+    too much changed) and the entry should be reloaded instead.
+    """
+    store = cache_data['songs']
+    changes = db.session.query(SongChange.id, SongChange.song_id).filter(SongChange.id > store.change_id).order_by(SongChange.id).all()
+    if not changes:
+        return True
+    
+    oldest_id = db.session.query(func.min(SongChange.id)).scalar()
+    song_ids = {song_id for change_id, song_id in changes}
+    if store.change_id < oldest_id - 1 or len(song_ids) > SONG_CHANGE_PATCH_LIMIT:
+        print(f"DEBUG - {len(song_ids)} songs changed since change {store.change_id}, reloading instead of patching")
+        return False
+    
+    song_ids = [song_id for song_id in song_ids if song_id in store.index_by_db_id]
+    for i in range(0, len(song_ids), DB_IN_CHUNK_SIZE):
+        chunk = song_ids[i:i + DB_IN_CHUNK_SIZE]
+        for song in Song.query.options(selectinload(Song.tags)).filter(Song.id.in_(chunk)):
+            apply_song_to_cache(cache_data, song)
+    if song_ids:
+        refresh_tag_table()
+    store.change_id = max(store.change_id, changes[-1][0])
+    print(f"DEBUG - Patched {len(song_ids)} changed songs into the liked songs cache (up to change {store.change_id})")
+    return True
+
+
+def write_through_song(song):
+    """Push a song's current tags and attributes into every cached store in this worker that holds it"""
+    for cache_data in liked_songs_cache.values():
+        apply_song_to_cache(cache_data, song)
+
+
+def write_through_tag_deleted(tag_id):
+    """Drop a deleted tag from every cached store in this worker"""
+    with tag_table_lock:
+        tag_table.pop(tag_id, None)
+    for cache_data in liked_songs_cache.values():
+        store = cache_data['songs']
+        for index in bitmap_indexes(store.tag_bitmaps.get(tag_id, 0)):
+            cache_data['total_untagged'] += store.set_tags(index, [t for t in store.tag_ids[index] if t != tag_id])
+        store.tag_bitmaps.pop(tag_id, None)
+
+
+def claim_cache_job(cache_key):
+    """Start a cache job for cache_key unless one is already running in some worker.
     
+    Returns (job_id, started); job_id is the running job's when started is False.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    progress = json.dumps({
+        'pages_fetched': 0,
+        'total_pages': 0,
+        'songs_cached': 0,
+        'total_songs': 0,
+        'eta_seconds': None,
+        'started_at': now
+    })
     try:
-        # Check if already cached and not too old (cache for 1 hour)
-        with cache_lock:
-            if cache_key in liked_songs_cache:
-                cache_time = liked_songs_cache[cache_key].get('cache_time', 0)
-                current_time = time.time()
-                if current_time - cache_time < 3600:  # 1 hour cache
-                    cache_data = liked_songs_cache[cache_key]
-                    print(f"DEBUG - Using existing cache for user {cache_key}")
-                    return {
-                        'status': 'already_cached', 
-                        'count': len(cache_data['songs']),
-                        'total_songs': cache_data.get('total_songs', 0),
-                        'total_untagged': cache_data.get('total_untagged', 0)
-                    }
-        
-        # Start fresh caching
-        user_token = session['token_info']['access_token']
-        sp = spotipy.Spotify(auth=user_token)
+        # Take over the user's row unless its job is still alive; the unique cache_key makes this atomic across workers
+        claimed = db.session.query(LikedSongsCacheJob).filter(
+            LikedSongsCacheJob.cache_key == cache_key,
+            (LikedSongsCacheJob.status != 'caching') | (LikedSongsCacheJob.updated_at < now - CACHE_JOB_STALE_AFTER)
+        ).update({'job_id': job_id, 'status': 'caching', 'progress': progress, 'updated_at': now}, synchronize_session=False)
+        if not claimed:
+            db.session.add(LikedSongsCacheJob(cache_key=cache_key, job_id=job_id, status='caching', progress=progress, updated_at=now))
+        db.session.commit()
+        return job_id, True
+    except IntegrityError:
+        db.session.rollback()
+    
+    running = LikedSongsCacheJob.query.filter_by(cache_key=cache_key).first()
+    return (running.job_id if running else None), False
+
+
+def update_cache_job(cache_key, job_id, status=None, **progress):
+    """Merge progress fields (and optionally a new status) into a cache job's row, if it is still that job"""
+    job = LikedSongsCacheJob.query.filter_by(cache_key=cache_key, job_id=job_id).first()
+    if job is None:
+        print(f"DEBUG - Cache job {job_id} for {cache_key} was superseded, not recording its progress")
+        return
+    job.progress = json.dumps({**json.loads(job.progress), **progress})
+    if status:
+        job.status = status
+    job.updated_at = time.time()
+    db.session.commit()
+
+
+def get_cache_job(cache_key):
+    """Status, job id and progress fields of the user's latest cache job, or None"""
+    job = LikedSongsCacheJob.query.filter_by(cache_key=cache_key).first()
+    if job is None:
+        return None
+    return {**json.loads(job.progress), 'status': job.status, 'job_id': job.job_id}
+
+
+def fetch_liked_songs_delta(cache_key, access_token, cache_data, job_id, limit=50):
+    """Fetch only the songs liked since cache_data was built.
+    
+    Saved tracks come newest first, so we page until we reach tracks added
+    before the newest one we know about. Known tracks found before that were
+    un-liked and liked again, so they move to the top. Tags and attributes of
+    carried-over songs are re-read from the database, since other workers may
+    have changed them. Returns (songs, newest_added_at, spotify_total), or
+    None when the counts don't add up (something was un-liked) and a full
+    re-scan is needed.
+    """
+    newest_added_at = cache_data.get('newest_added_at')
+    if not newest_added_at or cache_data.get('spotify_total') is None:
+        return None
+    
+    old_songs = cache_data['songs']
+    known_ids = set(old_songs.spotify_ids)
+    sp = spotipy.Spotify(auth=access_token)
+    
+    new_items = []
+    offset = 0
+    spotify_total = 0
+    while True:
+        page = sp.current_user_saved_tracks(limit=limit, offset=offset)
+        spotify_total = page.get('total') or 0
+        
+        reached_known = False
+        for item in page['items']:
+            track_id = item['track']['id'] if item['track'] else None
+            # Same timestamp as the newest known song: only unknown tracks are new
+            if item['added_at'] < newest_added_at or (item['added_at'] == newest_added_at and track_id in known_ids):
+                reached_known = True
+                break
+            new_items.append(item)
         
-        print("DEBUG - Starting to cache liked songs...")
-        cached_songs = []
-        offset = 0
-        limit = 50
+        update_cache_job(cache_key, job_id, pages_fetched=offset // limit + 1, songs_cached=len(new_items),
+                         sync_mode='incremental')
         
-        while True:
-            batch = sp.current_user_saved_tracks(limit=limit, offset=offset)
-            
-            if not batch['items']:
-                break
+        if reached_known or not page['next']:
+            break
+        offset += limit
+    
+    # Re-liked songs were un-liked (-1) and liked again (+1), so only unknown ones add to the total
+    moved_ids = {item['track']['id'] for item in new_items if item['track'] and item['track']['id'] in known_ids}
+    
+    # Cheap reconciliation: if anything was un-liked the totals won't line up
+    expected_total = cache_data['spotify_total'] + len(new_items) - len(moved_ids)
+    if spotify_total != expected_total:
+        print(f"DEBUG - Delta sync mismatch (Spotify has {spotify_total}, expected {expected_total}), need full re-scan")
+        return None
+    
+    saved_songs = save_songs_to_db([item['track'] for item in new_items])
+    tag_ids_by_song_id, attributes_by_song_id = load_song_states()
+    
+    songs = LikedSongsStore()
+    for position, item in enumerate(new_items):
+        if item['track'] and item['track']['id'] in saved_songs:
+            songs.append_track(item['track'], saved_songs[item['track']['id']], position)
+    
+    # Existing songs shift down past the new ones, and up past every moved song that was above them.
+    # Build a new store so readers of the old one aren't affected.
+    moved_positions = sorted(old_songs.positions[i] for i in range(len(old_songs)) if old_songs.spotify_ids[i] in moved_ids)
+    for i in range(len(old_songs)):
+        if old_songs.spotify_ids[i] in moved_ids:
+            continue
+        db_id = old_songs.db_ids[i]
+        position = old_songs.positions[i] + len(new_items) - bisect.bisect_left(moved_positions, old_songs.positions[i])
+        songs.append(old_songs.spotify_ids[i], db_id, position, old_songs.names[i], old_songs.artists[i], old_songs.albums[i],
+                     tag_ids_by_song_id.get(db_id, ()), *attributes_by_song_id.get(db_id, ()))
+    songs.finish()
+    
+    if new_items:
+        newest_added_at = new_items[0]['added_at']
+    
+    print(f"DEBUG - Delta sync found {len(new_items) - len(moved_ids)} newly liked and {len(moved_ids)} re-liked songs in {offset // limit + 1} API calls")
+    return songs, newest_added_at, spotify_total
+
+
+def fetch_all_liked_songs(cache_key, access_token, job_id, spotify_user_id, fetch_mode=None, concurrency=None):
+    """Full download of the user's saved tracks, reporting per-page progress.
+    
+    Returns (songs, newest_added_at, spotify_total).
+    """
+    print(f"DEBUG - [{job_id}] Starting to cache liked songs ({fetch_mode or LIKED_SONGS_FETCH_MODE} fetch)...")
+    cached_songs = LikedSongsStore()
+    newest_added_at = None
+    spotify_total = 0
+    limit = 50
+    started_at = time.time()
+    
+    for offset, batch in iter_saved_track_pages(access_token, limit, fetch_mode, concurrency):
+        if offset == 0:
+            spotify_total = batch.get('total') or 0
+            if batch['items']:
+                newest_added_at = batch['items'][0]['added_at']
+        
+        if not batch['items']:
+            continue
+        
+        # Save the whole page to the database to get db_ids
+        saved_songs = save_songs_to_db([item['track'] for item in batch['items']])
+        
+        for i, item in enumerate(batch['items']):
+            if item['track'] and item['track']['id'] in saved_songs:
+                cached_songs.append_track(item['track'], saved_songs[item['track']['id']], offset + i)
+        # Database search covers each page as soon as it arrives, long before the whole cache is built
+        record_liked_songs(spotify_user_id, [(saved_songs[item['track']['id']].id, offset + i)
+                                             for i, item in enumerate(batch['items'])
+                                             if item['track'] and item['track']['id'] in saved_songs])
+        
+        # Update per-page progress so /get-cache-progress has something real to report
+        total = batch.get('total') or 0
+        total_pages = (total + limit - 1) // limit if total else 0
+        pages_fetched = offset // limit + 1
+        elapsed = time.time() - started_at
+        eta_seconds = None
+        if total_pages:
+            eta_seconds = round(elapsed / pages_fetched * max(total_pages - pages_fetched, 0), 1)
+        
+        update_cache_job(cache_key, job_id, pages_fetched=pages_fetched, total_pages=total_pages,
+                         songs_cached=len(cached_songs), total_songs=total, eta_seconds=eta_seconds)
+        
+        print(f"DEBUG - [{job_id}] Cached {len(cached_songs)} songs so far (page {pages_fetched}/{total_pages})...")
+    
+    return cached_songs.finish(), newest_added_at, spotify_total
+
+
+def build_liked_songs_cache(cache_key, access_token, job_id, spotify_user_id, fetch_mode=None, concurrency=None, previous_cache=None):
+    """Background worker: page through saved tracks and fill liked_songs_cache.
+    
+    With previous_cache set it first tries an incremental sync, falling back
+    to a full fetch if that can't be reconciled.
+    """
+    with app.app_context():
+        try:
+            # Tags are read while the songs come in, so anything changed from here on gets patched in later
+            change_id = latest_song_change_id()
+            delta = None
+            if previous_cache:
+                print(f"DEBUG - [{job_id}] Trying incremental sync of liked songs...")
+                delta = fetch_liked_songs_delta(cache_key, access_token, previous_cache, job_id)
             
-            for i, item in enumerate(batch['items']):
-                if item['track']:
-                    track = item['track']
-                    
-                    # Save to database to get db_id
-                    saved_song = save_song_to_db(track)
-                    
-                    cached_song = {
-                        'name': track['name'],
-                        'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                        'album': track['album']['name'],
-                        'spotify_id': track['id'],
-                        'db_id': saved_song.id,
-                        'position': offset + i,
-                        'tags': [{'id': tag.id, 'name': tag.name, 'color': tag.color} for tag in saved_song.tags],
-                        'search_text': (track['name'] + ' ' + ', '.join([artist['name'] for artist in track['artists']])).lower()
-                    }
-                    cached_songs.append(cached_song)
+            if delta:
+                cached_songs, newest_added_at, spotify_total = delta
+            else:
+                cached_songs, newest_added_at, spotify_total = fetch_all_liked_songs(cache_key, access_token, job_id, spotify_user_id, fetch_mode, concurrency)
+            cached_songs.change_id = change_id
             
-            print(f"DEBUG - Cached {len(cached_songs)} songs so far...")
+            # Calculate totals for progress tracking
+            total_songs = len(cached_songs)
+            total_untagged = cached_songs.untagged_count()
             
-            if batch['next']:
-                offset += limit
-            else:
-                break
-        
-        # Calculate totals for progress tracking
-        total_songs = len(cached_songs)
-        total_untagged = sum(1 for song in cached_songs if len(song['tags']) == 0)
-        
-        # Store in global cache
-        with cache_lock:
-            liked_songs_cache[cache_key] = {
+            # Store in global cache, and persist it so other workers and restarts can reuse it
+            cache_time = time.time()
+            liked_songs_cache.set(cache_key, {
                 'songs': cached_songs,
-                'cache_time': time.time(),
+                'cache_time': cache_time,
                 'total_songs': total_songs,
-                'total_untagged': total_untagged
-            }
+                'total_untagged': total_untagged,
+                'spotify_user_id': spotify_user_id,
+                'newest_added_at': newest_added_at,
+                'spotify_total': spotify_total
+            })
+            save_liked_songs_snapshot(spotify_user_id, cached_songs, cache_time, newest_added_at, spotify_total)
+            
+            update_cache_job(cache_key, job_id, status='completed', sync_mode='incremental' if delta else 'full',
+                             songs_cached=total_songs, total_songs=total_songs, eta_seconds=0, finished_at=time.time())
+            
+            print(f"DEBUG - [{job_id}] Finished caching {total_songs} liked songs ({total_untagged} untagged)")
+            
+        except Exception as e:
+            print(f"Error caching liked songs: {e}")
+            db.session.rollback()
+            try:
+                update_cache_job(cache_key, job_id, status='error', error=str(e), finished_at=time.time())
+            except Exception as job_error:
+                print(f"Error recording failed cache job {job_id}: {job_error}")
+            
+        finally:
+            db.session.remove()
+
+
+@app.route('/cache-liked-songs')
+def cache_liked_songs():
+    """Pre-load and cache all liked songs for fast searching (runs in a background worker)"""
+    if 'token_info' not in session:
+        return {'error': 'Not authenticated'}, 401
+    
+    try:
+        cache_key = get_cache_key()
+        spotify_user_id = get_spotify_user_id()
+        print(f"DEBUG - Using cache key: {cache_key} (Spotify user {spotify_user_id})")
         
-        print(f"DEBUG - Finished caching {len(cached_songs)} liked songs ({total_untagged} untagged)")
+        # Check if already cached (here or in the persisted snapshot) and not too old (cache for 1 hour)
+        cache_data = get_liked_songs_cache()
+    except Exception as e:
+        print(f"Error checking liked songs cache: {e}")
+        return {'error': str(e)}, 500
+    
+    if cache_data and time.time() - cache_data.get('cache_time', 0) < 3600:  # 1 hour cache
+        print(f"DEBUG - Using existing cache for user {cache_key}")
         return {
-            'status': 'cached', 
-            'count': len(cached_songs),
-            'total_songs': total_songs,
-            'total_untagged': total_untagged
+            'status': 'already_cached', 
+            'count': len(cache_data['songs']),
+            'total_songs': cache_data.get('total_songs', 0),
+            'total_untagged': cache_data.get('total_untagged', 0)
         }
-        
+    
+    # Check if caching is already in progress for this user (in any worker), marking it as ours if not
+    job_id, started = claim_cache_job(cache_key)
+    if not started:
+        print(f"DEBUG - Caching already in progress for user {cache_key}")
+        return {
+            'status': 'caching_in_progress', 
+            'message': 'Cache operation already running',
+            'job_id': job_id,
+            'count': 0,
+            'total_songs': 0,
+            'total_untagged': 0
+        }
+    print(f"DEBUG - Starting cache job {job_id} for user {cache_key}")
+    
+    # Optional per-request overrides of the configured fetch mode / concurrency
+    fetch_mode = request.args.get('fetch_mode')
+    concurrency = request.args.get('concurrency', type=int)
+    
+    # A stale cache is refreshed incrementally unless a full re-download is asked for
+    sync_mode = request.args.get('mode', 'incremental')
+    previous_cache = cache_data if sync_mode == 'incremental' else None
+    
+    # Hand the actual paging off to a background thread so this worker is free immediately
+    worker = Thread(
+        target=build_liked_songs_cache,
+        args=(cache_key, session['token_info']['access_token'], job_id, spotify_user_id, fetch_mode, concurrency, previous_cache),
+        daemon=True
+    )
+    worker.start()
+    
+    return {
+        'status': 'caching_in_progress',
+        'message': 'Cache operation started',
+        'job_id': job_id,
+        'count': 0,
+        'total_songs': 0,
+        'total_untagged': 0
+    }
+
+@app.route('/get-cache-progress')
+def get_cache_progress():
+    """Get current caching progress"""
+    if 'token_info' not in session:
+        return {'error': 'Not authenticated'}, 401
+    
+    # Nothing can be caching until /cache-liked-songs has resolved who this is
+    if 'spotify_user_id' not in session:
+        return {'status': 'no_cache_key'}
+    cache_key = get_cache_key()
+    
+    progress = get_cache_job(cache_key)
+    
+    if progress:
+        return {
+            'status': progress['status'],
+            'job_id': progress.get('job_id'),
+            'pages_fetched': progress.get('pages_fetched', 0),
+            'total_pages': progress.get('total_pages', 0),
+            'songs_cached': progress['songs_cached'],
+            'total_songs': progress.get('total_songs', 0),
+            'eta_seconds': progress.get('eta_seconds'),
+            'sync_mode': progress.get('sync_mode'),
+            'error': progress.get('error')
+        }
+    else:
+        return {'status': 'not_caching'}
+
+
+# Set once the FTS5 mirror of the song table is in place (SQLite builds without FTS5 fall back to LIKE)
+song_fts_available = False
+
+SONG_FTS_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS song_fts USING fts5(
+        name, artist, album, content='song', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    # Keep the index in step with the song table however rows get written (ORM or bulk insert)
+    """CREATE TRIGGER IF NOT EXISTS song_fts_insert AFTER INSERT ON song BEGIN
+        INSERT INTO song_fts(rowid, name, artist, album) VALUES (new.id, new.name, new.artist, new.album);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS song_fts_delete AFTER DELETE ON song BEGIN
+        INSERT INTO song_fts(song_fts, rowid, name, artist, album) VALUES ('delete', old.id, old.name, old.artist, old.album);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS song_fts_update AFTER UPDATE OF name, artist, album ON song BEGIN
+        INSERT INTO song_fts(song_fts, rowid, name, artist, album) VALUES ('delete', old.id, old.name, old.artist, old.album);
+        INSERT INTO song_fts(rowid, name, artist, album) VALUES (new.id, new.name, new.artist, new.album);
+    END""",
+]
+
+
+def setup_song_search_index():
+    """Create the FTS5 mirror of song name/artist/album (and fill it the first time)"""
+    global song_fts_available
+    
+    if db.engine.dialect.name != 'sqlite':
+        print("DEBUG - Not SQLite, skipping FTS5 song index")
+        return
+    
+    try:
+        with db.engine.begin() as conn:
+            is_new = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'song_fts'")).first() is None
+            for statement in SONG_FTS_STATEMENTS:
+                conn.execute(text(statement))
+            if is_new:
+                conn.execute(text("INSERT INTO song_fts(song_fts) VALUES ('rebuild')"))
+                print("DEBUG - Built FTS5 song index from existing songs")
+        song_fts_available = True
+    except Exception as e:
+        print(f"ERROR - Could not set up FTS5 song index, search will use LIKE: {e}")
+
+
+def setup_song_feature_indexes():
+    """Index the audio feature columns for range filters (create_all won't add indexes to an existing table)"""
+    try:
+        with db.engine.begin() as conn:
+            for store_column, song_column, param in AUDIO_FEATURE_FILTERS.values():
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_song_{song_column} ON song ({song_column})"))
     except Exception as e:
-        print(f"Error caching liked songs: {e}")
-        return {'error': str(e)}, 500
-        
-    finally:
-        # Always remove from in-progress tracker when done (success or failure)
-        with caching_lock:
-            if cache_key in caching_in_progress:
-                del caching_in_progress[cache_key]
-                print(f"DEBUG - Removed cache progress tracker for user {cache_key}")
+        print(f"ERROR - Could not create audio feature indexes: {e}")
 
-@app.route('/get-cache-progress')
-def get_cache_progress():
-    """Get current caching progress"""
+
+def setup_liked_song_rows():
+    """Fill LikedSong from snapshots saved before the table existed, so database search works for those users at once"""
+    try:
+        users_with_rows = {row[0] for row in db.session.query(LikedSong.spotify_user_id).distinct()}
+        for snapshot in LikedSongsSnapshot.query.all():
+            if snapshot.spotify_user_id in users_with_rows:
+                continue
+            rows = json.loads(zlib.decompress(snapshot.songs_data).decode('utf-8'))['rows']
+            record_liked_songs(snapshot.spotify_user_id, [(row[1], row[5]) for row in rows])
+            print(f"DEBUG - Backfilled {len(rows)} liked songs for {snapshot.spotify_user_id} from the snapshot")
+    except Exception as e:
+        db.session.rollback()
+        print(f"ERROR - Could not backfill liked songs from snapshots: {e}")
+
+
+def search_songs_in_db(query, spotify_user_id, limit=20, offset=0):
+    """Search a user's liked songs in the database by name/artist/album, best matches first.
+    
+    The user's LikedSong rows are joined in SQL, so limit/offset page through
+    matches the user can actually see. Returns [(song_id, spotify_id, name, artist, album, position)].
+    """
+    tokens = search_tokens(query)
+    if not tokens:
+        return []
+    
+    if song_fts_available:
+        # Every word must match, the last one (still being typed) as a prefix; bm25 weights title > artist > album
+        match = ' '.join('"' + token.replace('"', '""') + '"' for token in tokens[:-1])
+        match = (match + ' "' + tokens[-1].replace('"', '""') + '"*').strip()
+        rows = db.session.execute(text("""
+            SELECT song.id, song.spotify_id, song.name, song.artist, song.album, liked_song.position
+            FROM song_fts
+            JOIN song ON song.id = song_fts.rowid
+            JOIN liked_song ON liked_song.song_id = song.id AND liked_song.spotify_user_id = :spotify_user_id
+            WHERE song_fts MATCH :match
+            ORDER BY bm25(song_fts, 3.0, 2.0, 1.0)
+            LIMIT :limit OFFSET :offset
+        """), {'match': match, 'spotify_user_id': spotify_user_id, 'limit': limit, 'offset': offset})
+        return [tuple(row) for row in rows]
+    
+    song_query = db.session.query(Song.id, Song.spotify_id, Song.name, Song.artist, Song.album, LikedSong.position).join(
+        LikedSong, (LikedSong.song_id == Song.id) & (LikedSong.spotify_user_id == spotify_user_id))
+    for token in tokens:
+        pattern = f"%{token}%"
+        song_query = song_query.filter(Song.name.ilike(pattern) | Song.artist.ilike(pattern) | Song.album.ilike(pattern))
+    return [tuple(row) for row in song_query.order_by(LikedSong.position).limit(limit).offset(offset)]
+
+
+@app.route('/get-cache-stats')
+def get_cache_stats():
+    """Hit/miss/eviction counters and memory use of this worker's liked songs cache"""
     if 'token_info' not in session:
         return {'error': 'Not authenticated'}, 401
     
-    cache_key = session.get('cache_key')
-    if not cache_key:
-        return {'status': 'no_cache_key'}
+    stats = liked_songs_cache.stats()
+    stats['filter_results'] = filter_result_cache.stats()
+    stats['ranked_searches'] = ranked_search_cache.stats()
+    stats['missing_audio_features'] = audio_features_missing.stats()
+    return stats
+
+
+def encode_search_cursor(cursor):
+    """Opaque URL-safe token for resuming a search"""
+    return base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode()
+
+
+def decode_search_cursor(token):
+    """Inverse of encode_search_cursor; raises ValueError on anything malformed"""
+    def is_int(value, minimum):
+        return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
     
-    if cache_key in caching_progress:
-        progress = caching_progress[cache_key]
-        return {
-            'status': progress['status'],
-            'songs_cached': progress['songs_cached']
-        }
-    else:
-        return {'status': 'not_caching'}
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(cursor, dict) or cursor.get('m') not in ('ranked', 'substring', 'structured'):
+            raise ValueError
+        if not isinstance(cursor.get('q'), str) or not isinstance(cursor.get('v'), (int, float)):
+            raise ValueError
+        if not (is_int(cursor.get('n'), 0) and is_int(cursor.get('t'), cursor['n'])):
+            raise ValueError
+        # Structured queries also depend on tags and attributes, so only they carry the store version
+        if cursor['m'] == 'structured' and not is_int(cursor.get('s'), 0):
+            raise ValueError
+        # Ranked pages resume at a count into the ranked list, the others just after a song index
+        if cursor['m'] != 'ranked' and not is_int(cursor.get('a'), -1):
+            raise ValueError
+        return cursor
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
 
 
 @app.route('/search-cached-liked-songs')
 def search_cached_liked_songs():
-    """Fast search through cached liked songs"""
+    """Fast search through cached liked songs.
+    
+    Besides plain words, q accepts structured terms such as
+    `artist:radiohead tag:rainy tempo:3-5 -tag:sad untagged`. Pass the returned
+    next_cursor back as ?cursor= (with the same q) to get the next page.
+    """
     if 'token_info' not in session:
         return {'error': 'Not authenticated'}, 401
     
-    # Get cache key from session (same as caching route)
-    cache_key = session.get('cache_key')
-    if not cache_key:
-        print("DEBUG - No cache key in session")
-        return {'error': 'No cache key. Please load cache first.'}, 400
+    # Check if we have cached data (in this worker or the persisted snapshot)
+    cache_data = get_liked_songs_cache()
+    if not cache_data:
+        print(f"DEBUG - No cached data for key: {get_cache_key()}")
+        # cache_missing tells the page to search the database instead
+        return {'error': 'No cached data. Please load cache first.', 'cache_missing': True}, 400
     
-    print(f"DEBUG - Searching with cache key: {cache_key}")
+    cached_songs = cache_data['songs']
+    total_songs = cache_data.get('total_songs', 0)
+    total_untagged = cache_data.get('total_untagged', 0)
     
-    # Check if we have cached data
-    with cache_lock:
-        if cache_key not in liked_songs_cache:
-            print(f"DEBUG - No cached data for key: {cache_key}")
-            return {'error': 'No cached data. Please load cache first.'}, 400
-        
-        cache_data = liked_songs_cache[cache_key]
-        cached_songs = cache_data['songs']
-        total_songs = cache_data.get('total_songs', 0)
-        total_untagged = cache_data.get('total_untagged', 0)
-    
-    query = request.args.get('q', '').strip().lower()
-    print(f"DEBUG - Searching cached data for: '{query}'")
+    query = request.args.get('q', '').strip()
+    mode = request.args.get('mode', 'ranked')  # 'ranked' (word/prefix, scored) or 'substring'
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    print(f"DEBUG - Searching cached data for: '{query}' ({mode})")
     
     if not query or len(query) < 2:
         return {'results': []}
     
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = decode_search_cursor(request.args['cursor'])
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        # Indexes in the cursor only mean something for the same query against the same cache build.
+        # Ranked and substring matches only depend on song text, structured ones on tags and attributes too.
+        if (cursor['q'] != query or cursor['v'] != cache_data['cache_time'] or
+                (cursor['m'] == 'structured' and cursor['s'] != cached_songs.version)):
+            return {'error': 'Search results have changed. Please search again.'}, 400
+        mode = cursor['m']
+    
     print(f"DEBUG - Searching through {len(cached_songs)} cached songs")
     
-    results = []
+    try:
+        library_query = LibraryQuery.parse(query)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    if library_query.structured:
+        mode = 'structured'
+    
     start_time = time.time()
+    page = []  # (index, score or None)
+    total_matches = cursor['t'] if cursor else 0
     
-    # Fast search through cached data
-    for song in cached_songs:
-        if query in song['search_text']:
-            results.append({
-                'name': song['name'],
-                'artist': song['artist'],
-                'album': song['album'],
-                'spotify_id': song['spotify_id'],
-                'db_id': song['db_id'],
-                'position': song['position'],
-                'tags': song['tags']
-            })
-            
-            if len(results) >= 20:  # Limit results
-                break
+    if mode == 'ranked':
+        if cursor is None:
+            # Scoring needs every match anyway, so the total comes for free; only the top `limit` get sorted
+            scores = cached_songs.ranked_scores(query)
+            total_matches = len(scores)
+            page = cached_songs.top_ranked(scores, limit)
+            # Mid-word fragments don't match any word, so fall back to a plain substring search
+            if not scores:
+                mode = 'substring'
+        else:
+            # Later pages slice the full ranked order, worked out once per query
+            ranked_indexes, ranked_scores = cached_songs.ranked_order(query)
+            start = cursor['n']
+            page = list(zip(ranked_indexes[start:start + limit], ranked_scores[start:start + limit]))
+    
+    if mode in ('substring', 'structured'):
+        # The first page finds every match to count them (the total rides along in the cursor);
+        # later pages resume just after the last song already returned
+        after = cursor['a'] if cursor else -1
+        find_limit = limit if cursor else None
+        if mode == 'structured':
+            matches = library_query.execute(cached_songs, find_limit, after)
+        else:
+            matches = cached_songs.search(query, find_limit, after)
+        if cursor is None:
+            total_matches = len(matches)
+        page = [(index, None) for index in matches[:limit]]
+    
+    results = []
+    for index, score in page:
+        result = cached_songs.song(index)
+        if score is not None:
+            result['score'] = round(score, 2)
+        results.append(result)
+    
+    returned = (cursor['n'] if cursor else 0) + len(page)
+    next_cursor = None
+    if page and returned < total_matches:
+        next_cursor = {
+            'q': query,
+            'm': mode,
+            'n': returned,
+            't': total_matches,
+            'v': cache_data['cache_time']
+        }
+        if mode != 'ranked':
+            next_cursor['a'] = page[-1][0]
+        if mode == 'structured':
+            next_cursor['s'] = cached_songs.version
+        next_cursor = encode_search_cursor(next_cursor)
     
     end_time = time.time()
     search_duration = end_time - start_time
-    print(f"DEBUG - Found {len(results)} results in {search_duration:.3f} seconds")
+    print(f"DEBUG - Found {len(results)} of {total_matches} results in {search_duration:.3f} seconds")
     
     return {
         'results': results, 
         'search_time': search_duration, 
         'cached_songs_count': len(cached_songs),
         'total_songs': total_songs,
-        'total_untagged': total_untagged
+        'total_untagged': total_untagged,
+        'total_matches': total_matches,
+        'next_cursor': next_cursor,
+        'structured': mode == 'structured'
+    }
+
+
+@app.route('/search-songs')
+def search_songs():
+    """Search the user's liked songs straight from the database - works before the liked songs cache is warm"""
+    if 'token_info' not in session:
+        return {'error': 'Not authenticated'}, 401
+    
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    if not query or len(query) < 2:
+        return {'results': []}
+    
+    start_time = time.time()
+    
+    try:
+        spotify_user_id = get_spotify_user_id()
+    except Exception as e:
+        print(f"Error looking up Spotify user for database search: {e}")
+        return {'error': str(e)}, 500
+    
+    rows = search_songs_in_db(query, spotify_user_id, limit=limit, offset=offset)
+    if not rows and not offset and not db.session.query(exists().where(LikedSong.spotify_user_id == spotify_user_id)).scalar():
+        # Songs are shared between users, so until the first page of liked songs is in there is nothing safe to return
+        print(f"DEBUG - No liked songs recorded yet for database search '{query}'")
+        return {'results': [], 'search_time': time.time() - start_time, 'liked_only': True, 'pending': True}
+    
+    results = []
+    for song_id, spotify_id, name, artist, album, position in rows:
+        results.append({
+            'name': name,
+            'artist': artist,
+            'album': album,
+            'spotify_id': spotify_id,
+            'db_id': song_id,
+            'position': position,
+            'tags': []
+        })
+    
+    # Attach tags with one query for the whole page
+    results_by_id = {result['db_id']: result for result in results}
+    if results_by_id:
+        tag_rows = db.session.query(song_tags.c.song_id, Tag.id, Tag.name, Tag.color).join(
+            Tag, Tag.id == song_tags.c.tag_id).filter(song_tags.c.song_id.in_(list(results_by_id)))
+        for song_id, tag_id, tag_name, tag_color in tag_rows:
+            results_by_id[song_id]['tags'].append({'id': tag_id, 'name': tag_name, 'color': tag_color})
+    
+    search_duration = time.time() - start_time
+    print(f"DEBUG - Database search for '{query}' found {len(results)} results in {search_duration:.3f} seconds")
+    
+    return {
+        'results': results,
+        'search_time': search_duration,
+        'source': 'fts' if song_fts_available else 'like',
+        'liked_only': True,
+        'next_offset': offset + limit if len(results) == limit else None
     }
 
 
+def get_untagged_navigation_store():
+    """Current user's cached liked songs store for untagged navigation, or None to fall back to scanning Spotify"""
+    try:
+        cache_data = get_liked_songs_cache()
+    except Exception as e:
+        print(f"DEBUG - Untagged navigation without liked songs cache: {e}")
+        return None
+    return cache_data['songs'] if cache_data else None
+
+
+def untagged_position_is_current(cached_songs, position):
+    """Whether the cached song at position is still at that position in Spotify, checked against the saved tracks window.
+    
+    The cached positions are as old as the cache build, while the window's
+    pages expire after SAVED_TRACKS_PAGE_TTL, so a liked or unliked song that
+    shifted positions since is caught here and navigation falls back to scanning.
+    """
+    index = bisect.bisect_left(cached_songs.positions, position)
+    if index >= len(cached_songs) or cached_songs.positions[index] != position:
+        return False
+    try:
+        page_offset = position - position % SAVED_TRACKS_PAGE_SIZE
+        fetched_at, entries, is_last_page = get_saved_tracks_window().page(page_offset)
+    except Exception as e:
+        print(f"DEBUG - Could not check cached untagged position {position}: {e}")
+        return False
+    entry = entries[position - page_offset] if position - page_offset < len(entries) else None
+    return entry is not None and entry['db_id'] == cached_songs.db_ids[index]
+
+
+def untagged_search_is_exhausted(cached_songs, forward=True):
+    """Whether the cache having no untagged song past the current one (before it if not forward) still holds in Spotify.
+    
+    Liking or unliking a song shifts the cache's last song (forwards) or first
+    song (backwards) off its position, and going forwards songs past the
+    cached ones are an extra tail, so either way navigation scans instead.
+    """
+    if not len(cached_songs):
+        return False
+    position = cached_songs.positions[-1] if forward else cached_songs.positions[0]
+    if not forward:
+        return position == 0 and untagged_position_is_current(cached_songs, position)
+    if not untagged_position_is_current(cached_songs, position):
+        return False
+    try:
+        page_offset = (position + 1) - (position + 1) % SAVED_TRACKS_PAGE_SIZE
+        fetched_at, entries, is_last_page = get_saved_tracks_window().page(page_offset)
+    except Exception as e:
+        print(f"DEBUG - Could not check the end of the cached liked songs: {e}")
+        return False
+    return is_last_page and len(entries) <= position + 1 - page_offset
+
 
 @app.route('/next-liked-song')
 def next_liked_song():
@@ -896,6 +2934,17 @@ def next_liked_song():
     if not untagged_only:
         return redirect(f'/tag-liked-songs?offset={search_offset}&untagged_only=false')
     
+    # With the liked songs cached this is a bisect over the untagged positions
+    cached_songs = get_untagged_navigation_store()
+    if cached_songs is not None:
+        next_position = cached_songs.next_untagged_position(current_offset)
+        print(f"DEBUG - Next untagged song from cache: {next_position}")
+        if next_position is None and untagged_search_is_exhausted(cached_songs):
+            return redirect(f'/tag-liked-songs?offset={search_offset}&untagged_only=true')
+        if next_position is not None and untagged_position_is_current(cached_songs, next_position):
+            return redirect(f'/tag-liked-songs?offset={next_position}&untagged_only=true')
+        print(f"DEBUG - Cached untagged position {next_position} is stale, scanning instead")
+    
     # If untagged_only is True, search forward for the next untagged song
     max_search = 200
     songs_checked = 0
@@ -904,23 +2953,23 @@ def next_liked_song():
         try:
             sp = spotipy.Spotify(auth=session['token_info']['access_token'])
             
-            results = sp.current_user_saved_tracks(limit=1, offset=search_offset)
+            results = sp.current_user_saved_tracks(limit=50, offset=search_offset)
             
             if not results['items']:
                 # No more songs
                 return redirect(f'/tag-liked-songs?offset={search_offset}&untagged_only=true')
-                
-            item = results['items'][0]
-            if item['track']:
-                saved_song = save_song_to_db(item['track'])
-                
-                # If this song is untagged, use it
-                if len(saved_song.tags) == 0:
-                    print(f"DEBUG - Found next untagged song at offset {search_offset}")
-                    return redirect(f'/tag-liked-songs?offset={search_offset}&untagged_only=true')
             
-            search_offset += 1
-            songs_checked += 1
+            saved_songs = save_songs_to_db([item['track'] for item in results['items']])
+            
+            for item in results['items']:
+                if item['track'] and item['track']['id'] in saved_songs:
+                    # If this song is untagged, use it
+                    if len(saved_songs[item['track']['id']].tags) == 0:
+                        print(f"DEBUG - Found next untagged song at offset {search_offset}")
+                        return redirect(f'/tag-liked-songs?offset={search_offset}&untagged_only=true')
+                
+                search_offset += 1
+                songs_checked += 1
             
         except Exception as e:
             print(f"Error checking offset {search_offset}: {e}")
@@ -950,40 +2999,98 @@ def prev_liked_song():
     if not untagged_only:
         return redirect(f'/tag-liked-songs?offset={search_offset}&untagged_only=false')
     
+    cached_songs = get_untagged_navigation_store()
+    if cached_songs is not None:
+        prev_position = cached_songs.prev_untagged_position(current_offset)
+        print(f"DEBUG - Previous untagged song from cache: {prev_position}")
+        if prev_position is None and untagged_search_is_exhausted(cached_songs, forward=False):
+            return redirect(f'/tag-liked-songs?offset=0&untagged_only=true')
+        if prev_position is not None and untagged_position_is_current(cached_songs, prev_position):
+            return redirect(f'/tag-liked-songs?offset={prev_position}&untagged_only=true')
+        print(f"DEBUG - Cached untagged position {prev_position} is stale, scanning instead")
+    
     # If untagged_only is True, search backwards for the previous untagged song
     while search_offset >= 0:
+        # Fetch the page that ends at search_offset and walk it backwards
+        page_start = max(0, search_offset - 49)
         try:
             sp = spotipy.Spotify(auth=session['token_info']['access_token'])
             
-            results = sp.current_user_saved_tracks(limit=1, offset=search_offset)
+            results = sp.current_user_saved_tracks(limit=search_offset - page_start + 1, offset=page_start)
+            saved_songs = save_songs_to_db([item['track'] for item in results['items']])
             
-            if not results['items']:
-                search_offset -= 1
-                continue
-                
-            item = results['items'][0]
-            if item['track']:
-                saved_song = save_song_to_db(item['track'])
-                
-                # If this song is untagged, use it
-                if len(saved_song.tags) == 0:
-                    print(f"DEBUG - Found previous untagged song at offset {search_offset}")
-                    return redirect(f'/tag-liked-songs?offset={search_offset}&untagged_only=true')
-            
-            search_offset -= 1
+            for i in reversed(range(len(results['items']))):
+                item = results['items'][i]
+                if item['track'] and item['track']['id'] in saved_songs:
+                    # If this song is untagged, use it
+                    if len(saved_songs[item['track']['id']].tags) == 0:
+                        print(f"DEBUG - Found previous untagged song at offset {page_start + i}")
+                        return redirect(f'/tag-liked-songs?offset={page_start + i}&untagged_only=true')
             
         except Exception as e:
-            print(f"Error checking offset {search_offset}: {e}")
-            search_offset -= 1
+            print(f"Error checking offsets {page_start}-{search_offset}: {e}")
+        
+        search_offset = page_start - 1
     
     # If we get here, no previous untagged song found, go to beginning
     return redirect(f'/tag-liked-songs?offset=0&untagged_only=true')
 
 
 
+def filter_song_ids(criteria):
+    """Ids of every song matching the criteria, computed in a single SQL statement.
+    
+    criteria uses the smart playlist [ST:] format: 't', 'e' and 'm' are
+    [min, max] ranges of the manual 1-5 attributes (songs without them never
+    match), 'bpm', 'se' and 'sv' optional [min, max] ranges of the Spotify
+    audio features (either end may be None), 'i' lists tag ids a song must
+    all have and 'x' tag ids it must have none of.
+    """
+    query = db.session.query(Song.id)
+    for column, key in ((Song.tempo, 't'), (Song.energy, 'e'), (Song.mood, 'm')):
+        low, high = criteria.get(key, [1, 5])
+        query = query.filter(column.between(int(low), int(high)))
+    
+    # Audio feature columns are indexed, so these are index range scans
+    for key, (store_column, song_column, param) in AUDIO_FEATURE_FILTERS.items():
+        if criteria.get(key):
+            low, high = criteria[key]
+            column = getattr(Song, song_column)
+            if low is not None:
+                query = query.filter(column >= float(low))
+            if high is not None:
+                query = query.filter(column <= float(high))
+    
+    include_tag_ids = {int(tag_id) for tag_id in criteria.get('i', [])}
+    if include_tag_ids:
+        # Songs carrying every include tag have one song_tags row per tag
+        query = (query.join(song_tags, song_tags.c.song_id == Song.id)
+                 .filter(song_tags.c.tag_id.in_(include_tag_ids))
+                 .group_by(Song.id)
+                 .having(func.count(song_tags.c.tag_id) == len(include_tag_ids)))
+    
+    exclude_tag_ids = {int(tag_id) for tag_id in criteria.get('x', [])}
+    if exclude_tag_ids:
+        # Aliased so it doesn't correlate with the include join above
+        excluded = song_tags.alias('excluded_song_tags')
+        query = query.filter(~exists().where(excluded.c.song_id == Song.id, excluded.c.tag_id.in_(exclude_tag_ids)))
+    
+    return {row[0] for row in query}
+
+
+def filter_liked_song_indexes(store, criteria):
+    """Indexes into a LikedSongsStore of the songs matching criteria, in library order"""
+    matching_ids = filter_song_ids(criteria)
+    return [index for index, db_id in enumerate(store.db_ids) if db_id in matching_ids]
+
+
 @app.route('/filter-liked-songs')
 def filter_liked_songs():
-    """Filter liked songs based on attribute ranges and selected tags"""
+    """Filter liked songs based on attribute ranges and selected tags.
+    
+    Accepts optional offset/limit, and format=ndjson to stream the songs as
+    newline-delimited JSON (total in the X-Total-Count header).
+    """
     if 'token_info' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
@@ -1015,71 +3122,50 @@ def filter_liked_songs():
         print(f"DEBUG - Parsed exclude tag IDs: {exclude_tag_ids}")
         
         # Get user's liked songs from cache
-        cache_key = session.get('cache_key')
-        if not cache_key or cache_key not in liked_songs_cache:
+        cache_data = get_liked_songs_cache()
+        if not cache_data:
             print("DEBUG - No cached liked songs, need to load cache first")
             return jsonify({'error': 'Please load your liked songs cache first (search box should trigger this)'}), 400
         
-        with cache_lock:
-            cached_songs = liked_songs_cache[cache_key]['songs']
+        cached_songs = cache_data['songs']
         
         print(f"DEBUG - Found {len(cached_songs)} cached liked songs")
         
-        # Filter songs by attributes and tags
-        filtered_songs = []
-        
-        for cached_song in cached_songs:
-            # Get the full song data from database
-            song = Song.query.get(cached_song['db_id'])
-            if not song:
-                continue
-            
-            # Handle NULL attributes - skip songs that haven't been set yet
-            if song.tempo is None or song.energy is None or song.mood is None:
-                print(f"DEBUG - Skipping song {song.name} - has NULL attributes")
-                continue
-            
-            # Check attribute ranges (now safe since we excluded NULLs)
-            if song.tempo < tempo_min or song.tempo > tempo_max:
-                continue
-            if song.energy < energy_min or song.energy > energy_max:
-                continue
-            if song.mood < mood_min or song.mood > mood_max:
-                continue
-            
-            # Get song's tag IDs
-            song_tag_ids = {tag.id for tag in song.tags}
-            
-            # Check include tags: song must have ALL selected include tags
-            if include_tag_ids:
-                required_include_tag_ids = set(include_tag_ids)
-                if not required_include_tag_ids.issubset(song_tag_ids):
-                    continue
-            
-            # Check exclude tags: song must NOT have ANY selected exclude tags
-            if exclude_tag_ids:
-                excluded_tag_ids = set(exclude_tag_ids)
-                if excluded_tag_ids.intersection(song_tag_ids):
-                    continue
+        # Filter songs by attributes and tags (songs without attributes set never match)
+        criteria = {
+            't': [tempo_min, tempo_max],
+            'e': [energy_min, energy_max],
+            'm': [mood_min, mood_max],
+            'i': include_tag_ids,
+            'x': exclude_tag_ids
+        }
+        criteria.update(audio_feature_criteria(request.args))
+        # The live filter preview reads the in-memory indexes, so no database queries at all
+        matching_indexes = cached_songs.cached_filter_indexes(criteria)
+        print(f"DEBUG - Filtered to {len(matching_indexes)} songs matching criteria")
+        
+        # Optional paging (total_count and facets always cover every match)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = request.args.get('limit', type=int)
+        page_indexes = matching_indexes[offset:None if limit is None else offset + max(limit, 0)]
+        
+        if request.args.get('format') == 'ndjson':
+            # One song per line, serialized as it's sent, so nothing big is built up front
+            def generate():
+                for index in page_indexes:
+                    yield json.dumps(cached_songs.filter_song(index), separators=(',', ':')) + '\n'
             
-            # Song matches all criteria
-            filtered_songs.append({
-                'id': song.id,
-                'spotify_id': song.spotify_id,
-                'name': song.name,
-                'artist': song.artist,
-                'tempo': song.tempo,
-                'energy': song.energy,
-                'mood': song.mood,
-                'tags': [{'id': tag.id, 'name': tag.name} for tag in song.tags]
-            })
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                            headers={'X-Total-Count': str(len(matching_indexes))})
         
-        print(f"DEBUG - Filtered to {len(filtered_songs)} songs matching criteria")
+        filtered_songs = [cached_songs.filter_song(index) for index in page_indexes]
         
         return jsonify({
             'success': True,
             'songs': filtered_songs,
-            'count': len(filtered_songs)
+            'count': len(filtered_songs),
+            'total_count': len(matching_indexes),
+            'facets': cached_songs.facet_counts(matching_indexes)
         })
         
     except Exception as e:
@@ -1403,46 +3489,22 @@ def create_filtered_playlist():
         print(f"DEBUG - Include tags: {include_tag_ids}, Exclude tags: {exclude_tag_ids}")
         
         # Re-run the filtering logic to get matching songs
-        cache_key = session.get('cache_key')
-        if not cache_key or cache_key not in liked_songs_cache:
+        cache_data = get_liked_songs_cache()
+        if not cache_data:
             return jsonify({'error': 'No cached songs available'}), 400
         
-        with cache_lock:
-            cached_songs = liked_songs_cache[cache_key]['songs']
+        cached_songs = cache_data['songs']
         
         # Filter songs using same logic as filter endpoint
-        matching_spotify_ids = []
-        
-        for cached_song in cached_songs:
-            song = Song.query.get(cached_song['db_id'])
-            if not song:
-                continue
-            
-            # Check attribute ranges
-            if song.tempo < tempo_min or song.tempo > tempo_max:
-                continue
-            if song.energy < energy_min or song.energy > energy_max:
-                continue
-            if song.mood < mood_min or song.mood > mood_max:
-                continue
-            
-            # Get song's tag IDs
-            song_tag_ids = {tag.id for tag in song.tags}
-            
-            # Check include tags
-            if include_tag_ids:
-                required_include_tag_ids = set(include_tag_ids)
-                if not required_include_tag_ids.issubset(song_tag_ids):
-                    continue
-            
-            # Check exclude tags
-            if exclude_tag_ids:
-                excluded_tag_ids = set(exclude_tag_ids)
-                if excluded_tag_ids.intersection(song_tag_ids):
-                    continue
-            
-            # Song matches - add its Spotify ID
-            matching_spotify_ids.append(song.spotify_id)
+        criteria = {
+            't': [tempo_min, tempo_max],
+            'e': [energy_min, energy_max],
+            'm': [mood_min, mood_max],
+            'i': include_tag_ids,
+            'x': exclude_tag_ids
+        }
+        criteria.update(audio_feature_criteria(data))
+        matching_spotify_ids = [cached_songs.spotify_ids[index] for index in filter_liked_song_indexes(cached_songs, criteria)]
         
         print(f"DEBUG - Found {len(matching_spotify_ids)} matching songs")
         
@@ -1624,7 +3686,7 @@ def get_smart_playlists():
                                     import base64
                                     import json
                                     criteria_json = base64.b64decode(encoded_part).decode('utf-8')
-                                    criteria = json.loads(criteria_json)
+                                    criteria = drop_open_feature_ranges(json.loads(criteria_json))
                                     
                                     print(f"DEBUG - Parsed criteria: {criteria}")
                                     
@@ -1720,7 +3782,7 @@ def refresh_smart_playlist():
             import base64
             import json
             criteria_json = base64.b64decode(encoded_part).decode('utf-8')
-            criteria = json.loads(criteria_json)
+            criteria = drop_open_feature_ranges(json.loads(criteria_json))
             
             print(f"DEBUG - Parsed criteria: {criteria}")
             
@@ -1747,59 +3809,30 @@ def refresh_smart_playlist():
         print(f"DEBUG - Playlist currently has {len(current_track_ids)} songs")
         
         # Get cached liked songs
-        cache_key = session.get('cache_key')
-        if not cache_key or cache_key not in liked_songs_cache:
+        cache_data = get_liked_songs_cache()
+        if not cache_data:
             return jsonify({'error': 'Liked songs cache not available. Please go to Tag Songs tab and search something to load cache.'}), 400
         
-        with cache_lock:
-            cached_songs = liked_songs_cache[cache_key]['songs']
+        cached_songs = cache_data['songs']
         
         print(f"DEBUG - Checking against {len(cached_songs)} cached liked songs")
         
         # Find songs that match criteria but aren't in playlist
         matching_songs = []
-        songs_checked = 0
+        songs_checked = len(cached_songs)
         
-        for cached_song in cached_songs:
-            songs_checked += 1
+        for index in filter_liked_song_indexes(cached_songs, criteria):
+            spotify_id = cached_songs.spotify_ids[index]
             
             # Skip if already in playlist
-            if cached_song['spotify_id'] in current_track_ids:
-                continue
-            
-            # Get song from database to check attributes
-            song = Song.query.get(cached_song['db_id'])
-            if not song:
-                continue
-            
-            # Check attribute ranges
-            if song.tempo < tempo_min or song.tempo > tempo_max:
-                continue
-            if song.energy < energy_min or song.energy > energy_max:
+            if spotify_id in current_track_ids:
                 continue
-            if song.mood < emotion_min or song.mood > emotion_max:
-                continue
-            
-            # Get song's tag IDs
-            song_tag_ids = {tag.id for tag in song.tags}
-            
-            # Check include tags - song must have ALL required tags
-            if include_tag_ids:
-                required_tag_ids = set(include_tag_ids)
-                if not required_tag_ids.issubset(song_tag_ids):
-                    continue
-            
-            # Check exclude tags - song must NOT have ANY excluded tags
-            if exclude_tag_ids:
-                excluded_tag_ids = set(exclude_tag_ids)
-                if excluded_tag_ids.intersection(song_tag_ids):
-                    continue
             
             # Song matches criteria and isn't in playlist - add it
             matching_songs.append({
-                'spotify_id': cached_song['spotify_id'],
-                'name': cached_song['name'],
-                'artist': cached_song['artist']
+                'spotify_id': spotify_id,
+                'name': cached_songs.names[index],
+                'artist': cached_songs.artists[index]
             })
         
         print(f"DEBUG - Found {len(matching_songs)} new songs to add (checked {songs_checked} total)")
@@ -1860,12 +3893,11 @@ def refresh_all_smart_playlists():
         user_id = sp.current_user()['id']
         
         # Get cached liked songs
-        cache_key = session.get('cache_key')
-        if not cache_key or cache_key not in liked_songs_cache:
+        cache_data = get_liked_songs_cache()
+        if not cache_data:
             return jsonify({'error': 'Liked songs cache not available. Please go to Tag Songs tab and search something to load cache.'}), 400
         
-        with cache_lock:
-            cached_songs = liked_songs_cache[cache_key]['songs']
+        cached_songs = cache_data['songs']
         
         print(f"DEBUG - Using {len(cached_songs)} cached liked songs for matching")
         
@@ -1880,6 +3912,10 @@ def refresh_all_smart_playlists():
                 if playlist['owner']['id'] == user_id:
                     playlists_scanned += 1
                     
+                    # The playlist list already includes descriptions, so only fetch details for smart playlists
+                    if '[ST:' not in (playlist.get('description') or ''):
+                        continue
+                    
                     try:
                         # Get full playlist details
                         full_playlist = sp.playlist(playlist['id'], fields='id,name,description,tracks.items(track(id))')
@@ -1895,7 +3931,7 @@ def refresh_all_smart_playlists():
                                 import base64
                                 import json
                                 criteria_json = base64.b64decode(encoded_part).decode('utf-8')
-                                criteria = json.loads(criteria_json)
+                                criteria = drop_open_feature_ranges(json.loads(criteria_json))
                                 
                                 # Get current songs in playlist
                                 current_track_ids = set()
@@ -1937,64 +3973,35 @@ def refresh_all_smart_playlists():
                 'message': f'No smart playlists found (scanned {playlists_scanned} playlists)'
             })
         
-        # Step 2: Refresh each smart playlist
+        # Step 2: Match every playlist's criteria against the cached store (kept in step with the database,
+        # and playlists sharing criteria share the cached result)
+        candidates_per_playlist = [cached_songs.cached_filter_indexes(playlist_info['criteria'])
+                                   for playlist_info in smart_playlists]
+        
+        # Step 3: Refresh each smart playlist
         results = []
         total_songs_added = 0
         
-        for playlist_info in smart_playlists:
+        for playlist_info, candidate_indexes in zip(smart_playlists, candidates_per_playlist):
             print(f"DEBUG - Processing playlist: {playlist_info['name']}")
             
-            criteria = playlist_info['criteria']
             current_track_ids = playlist_info['current_tracks']
             
-            # Extract filter parameters
-            tempo_min, tempo_max = criteria.get('t', [1, 5])
-            energy_min, energy_max = criteria.get('e', [1, 5])
-            emotion_min, emotion_max = criteria.get('m', [1, 5])
-            include_tag_ids = criteria.get('i', [])
-            exclude_tag_ids = criteria.get('x', [])
-            
             # Find matching songs not in playlist
             matching_songs = []
             
-            for cached_song in cached_songs:
-                # Skip if already in playlist
-                if cached_song['spotify_id'] in current_track_ids:
-                    continue
-                
-                # Get song from database to check attributes
-                song = Song.query.get(cached_song['db_id'])
-                if not song:
-                    continue
+            for index in candidate_indexes:
+                spotify_id = cached_songs.spotify_ids[index]
                 
-                # Check attribute ranges
-                if song.tempo < tempo_min or song.tempo > tempo_max:
-                    continue
-                if song.energy < energy_min or song.energy > energy_max:
-                    continue
-                if song.mood < emotion_min or song.mood > emotion_max:
+                # Skip if already in playlist
+                if spotify_id in current_track_ids:
                     continue
                 
-                # Get song's tag IDs
-                song_tag_ids = {tag.id for tag in song.tags}
-                
-                # Check include tags
-                if include_tag_ids:
-                    required_tag_ids = set(include_tag_ids)
-                    if not required_tag_ids.issubset(song_tag_ids):
-                        continue
-                
-                # Check exclude tags
-                if exclude_tag_ids:
-                    excluded_tag_ids = set(exclude_tag_ids)
-                    if excluded_tag_ids.intersection(song_tag_ids):
-                        continue
-                
                 # Song matches criteria
                 matching_songs.append({
-                    'spotify_id': cached_song['spotify_id'],
-                    'name': cached_song['name'],
-                    'artist': cached_song['artist']
+                    'spotify_id': spotify_id,
+                    'name': cached_songs.names[index],
+                    'artist': cached_songs.artists[index]
                 })
             
             print(f"DEBUG - Found {len(matching_songs)} new songs for {playlist_info['name']}")
@@ -2263,41 +4270,25 @@ def get_next_song_info():
         # Check if token needs refreshing
         if is_token_expired(session['token_info']):
             session['token_info'] = refresh_access_token(session['token_info'])
-
-        sp = spotipy.Spotify(auth=session['token_info']['access_token'])
         
-        # Find the next song
-        search_offset = current_offset + 1
-        max_search = 50  # Reduced search limit for background operation
-        songs_checked = 0
+        # Find the next song (reduced search limit for background operation)
+        next_offset, entry = find_saved_track(current_offset + 1, untagged_only=untagged_only, max_search=50)
         
-        while songs_checked < max_search:
-            results = sp.current_user_saved_tracks(limit=1, offset=search_offset)
-            
-            if not results['items']:
+        if next_offset is None:
+            if entry:
                 # No more songs
                 return {'has_next': False}
-                
-            item = results['items'][0]
-            if item['track']:
-                saved_song = save_song_to_db(item['track'])
-                songs_checked += 1
-                
-                # If not filtering or song is untagged, this is our next song
-                if not untagged_only or len(saved_song.tags) == 0:
-                    return {
-                        'has_next': True,
-                        'next_offset': search_offset,
-                        'song_id': saved_song.id,
-                        'spotify_id': item['track']['id'],
-                        'name': item['track']['name'],
-                        'artist': ', '.join([artist['name'] for artist in item['track']['artists']])
-                    }
-            
-            search_offset += 1
-            
-        # Searched too many songs without finding untagged one
-        return {'has_next': False, 'searched_limit_reached': True}
+            # Searched too many songs without finding untagged one
+            return {'has_next': False, 'searched_limit_reached': True}
+        
+        return {
+            'has_next': True,
+            'next_offset': next_offset,
+            'song_id': entry['db_id'],
+            'spotify_id': entry['spotify_id'],
+            'name': entry['name'],
+            'artist': entry['artist']
+        }
         
     except Exception as e:
         print(f"Error getting next song info: {e}")
@@ -2316,63 +4307,79 @@ def get_song_data(offset):
         # Check if token needs refreshing
         if is_token_expired(session['token_info']):
             session['token_info'] = refresh_access_token(session['token_info'])
-
-        sp = spotipy.Spotify(auth=session['token_info']['access_token'])
         
-        # Find the song at this offset (reuse existing logic)
-        current_position = offset
-        songs_examined = 0
-        max_search = 200
+        # Find the song at this offset through the saved tracks window
+        actual_position, entry = find_saved_track(offset, untagged_only=untagged_only)
         
-        while songs_examined < max_search:
-            results = sp.current_user_saved_tracks(limit=50, offset=current_position)
-            
-            if not results['items']:
-                return {'error': 'No more songs'}, 404
-            
-            # Look through this batch
-            for i, item in enumerate(results['items']):
-                if item['track']:
-                    actual_position = current_position + i
-                    songs_examined += 1
-                    
-                    saved_song = save_song_to_db(item['track'])
-                    
-                    if untagged_only and len(saved_song.tags) > 0:
-                        continue
-                    
-                    # Format the song data
-                    duration_ms = item['track']['duration_ms']
-                    minutes = duration_ms // 60000
-                    seconds = (duration_ms % 60000) // 1000
-                    duration_formatted = f"{minutes}:{seconds:02d}"
-                    
-                    return {
-                        'success': True,
-                        'song': {
-                            'name': item['track']['name'],
-                            'artist': ', '.join([artist['name'] for artist in item['track']['artists']]),
-                            'album': item['track']['album']['name'],
-                            'duration': duration_formatted,
-                            'spotify_id': item['track']['id'],
-                            'db_id': saved_song.id,
-                            'actual_position': actual_position
-                        }
-                    }
-            
-            # No matching song in this batch, get next batch
-            if results['next']:
-                current_position += 50
-            else:
-                break
+        if actual_position is None:
+            return {'error': 'No more songs' if entry else 'No matching songs found'}, 404
         
-        return {'error': 'No matching songs found'}, 404
+        return {
+            'success': True,
+            'song': {
+                'name': entry['name'],
+                'artist': entry['artist'],
+                'album': entry['album'],
+                'duration': format_duration(entry['duration_ms']),
+                'spotify_id': entry['spotify_id'],
+                'db_id': entry['db_id'],
+                'actual_position': actual_position
+            }
+        }
         
     except Exception as e:
         print(f"Error getting song data: {e}")
         return {'error': str(e)}, 500
 
 
+@app.route('/get-song-bundle/<int:offset>')
+def get_song_bundle_at(offset):
+    """Song at this offset plus its tags, attribute status and stored audio features in one response.
+    
+    Also looks up the audio features of the next few songs in the background.
+    """
+    if 'token_info' not in session:
+        return {'error': 'Not authenticated'}, 401
+    
+    try:
+        untagged_only = request.args.get('untagged_only', 'false') == 'true'
+        warm = max(0, min(request.args.get('warm', SONG_BUNDLE_WARM_AHEAD, type=int), 10))
+        
+        # Check if token needs refreshing
+        if is_token_expired(session['token_info']):
+            session['token_info'] = refresh_access_token(session['token_info'])
+        
+        window = get_saved_tracks_window()
+        actual_position, entry = window.find(offset, untagged_only=untagged_only)
+        if actual_position is None:
+            return {'error': 'No more songs' if entry else 'No matching songs found'}, 404
+        
+        bundle = get_song_bundle(entry['db_id'])
+        if bundle is None:
+            return {'error': 'Song not found'}, 404
+        
+        if warm:
+            queue_song_bundle_warm(window, actual_position, untagged_only, warm)
+        
+        return {
+            'success': True,
+            'song': {
+                'name': entry['name'],
+                'artist': entry['artist'],
+                'album': entry['album'],
+                'duration': format_duration(entry['duration_ms']),
+                'spotify_id': entry['spotify_id'],
+                'db_id': entry['db_id'],
+                'actual_position': actual_position
+            },
+            **bundle
+        }
+        
+    except Exception as e:
+        print(f"Error getting song bundle: {e}")
+        return {'error': str(e)}, 500
+
+
 @app.route('/get-song-attributes-with-status/<int:song_id>')
 def get_song_attributes_with_status(song_id):
     """Get current attributes and whether they've been manually set"""
@@ -2412,6 +4419,15 @@ def get_next_untagged_offset():
         # Check if token needs refreshing
         if is_token_expired(session['token_info']):
             session['token_info'] = refresh_access_token(session['token_info'])
+        
+        cached_songs = get_untagged_navigation_store()
+        if cached_songs is not None:
+            next_position = cached_songs.next_untagged_position(current_offset)
+            if next_position is None and untagged_search_is_exhausted(cached_songs):
+                return {'found': False, 'reason': 'end_of_songs'}
+            if next_position is not None and untagged_position_is_current(cached_songs, next_position):
+                return {'found': True, 'offset': next_position}
+            print(f"DEBUG - Cached untagged position {next_position} is stale, scanning instead")
 
         sp = spotipy.Spotify(auth=session['token_info']['access_token'])
         
@@ -2421,20 +4437,21 @@ def get_next_untagged_offset():
         songs_checked = 0
         
         while songs_checked < max_search:
-            results = sp.current_user_saved_tracks(limit=1, offset=search_offset)
+            results = sp.current_user_saved_tracks(limit=50, offset=search_offset)
             
             if not results['items']:
                 return {'found': False, 'reason': 'end_of_songs'}
-                
-            item = results['items'][0]
-            if item['track']:
-                saved_song = save_song_to_db(item['track'])
-                songs_checked += 1
-                
-                if len(saved_song.tags) == 0:
-                    return {'found': True, 'offset': search_offset}
             
-            search_offset += 1
+            saved_songs = save_songs_to_db([item['track'] for item in results['items']])
+            
+            for item in results['items']:
+                if item['track'] and item['track']['id'] in saved_songs:
+                    songs_checked += 1
+                    
+                    if len(saved_songs[item['track']['id']].tags) == 0:
+                        return {'found': True, 'offset': search_offset}
+                
+                search_offset += 1
             
         return {'found': False, 'reason': 'search_limit_reached'}
         
@@ -2458,6 +4475,15 @@ def get_prev_untagged_offset():
         # Check if token needs refreshing
         if is_token_expired(session['token_info']):
             session['token_info'] = refresh_access_token(session['token_info'])
+        
+        cached_songs = get_untagged_navigation_store()
+        if cached_songs is not None:
+            prev_position = cached_songs.prev_untagged_position(current_offset)
+            if prev_position is None and untagged_search_is_exhausted(cached_songs, forward=False):
+                return {'found': False, 'reason': 'no_previous_untagged'}
+            if prev_position is not None and untagged_position_is_current(cached_songs, prev_position):
+                return {'found': True, 'offset': prev_position}
+            print(f"DEBUG - Cached untagged position {prev_position} is stale, scanning instead")
 
         sp = spotipy.Spotify(auth=session['token_info']['access_token'])
         
@@ -2465,20 +4491,18 @@ def get_prev_untagged_offset():
         search_offset = current_offset - 1
         
         while search_offset >= 0:
-            results = sp.current_user_saved_tracks(limit=1, offset=search_offset)
+            # Fetch the page that ends at search_offset and walk it backwards
+            page_start = max(0, search_offset - 49)
+            results = sp.current_user_saved_tracks(limit=search_offset - page_start + 1, offset=page_start)
+            saved_songs = save_songs_to_db([item['track'] for item in results['items']])
             
-            if not results['items']:
-                search_offset -= 1
-                continue
-                
-            item = results['items'][0]
-            if item['track']:
-                saved_song = save_song_to_db(item['track'])
-                
-                if len(saved_song.tags) == 0:
-                    return {'found': True, 'offset': search_offset}
+            for i in reversed(range(len(results['items']))):
+                item = results['items'][i]
+                if item['track'] and item['track']['id'] in saved_songs:
+                    if len(saved_songs[item['track']['id']].tags) == 0:
+                        return {'found': True, 'offset': page_start + i}
             
-            search_offset -= 1
+            search_offset = page_start - 1
             
         return {'found': False, 'reason': 'no_previous_untagged'}
         
@@ -2536,6 +4560,10 @@ try:
         db.create_all() 
         print("Database tables created successfully!")
         
+        setup_song_search_index()
+        setup_song_feature_indexes()
+        setup_liked_song_rows()
+        
         # List contents after creation
         if os.path.exists(app.instance_path):
             print(f"DEBUG - Instance folder after creation: {os.listdir(app.instance_path)}")